@@ -1,208 +1,171 @@
 #!/usr/bin/env python3
 """
 async_processor.py - Asynchronously process data from PHP and write to file
-Prints ALL output and ERRORS to Docker container stdout
+Logs to the Docker container stdout/stderr (see debug_utils.py for LOG_* settings)
 """
 
 import sys
 import json
 import os
 from datetime import datetime
-import requests
 import traceback
-import re
+import time
 import uuid
-import csv
+import argparse
+import functools
 
-# Force unbuffered output for immediate Docker visibility
-sys.stdout = open(sys.stdout.fileno(), mode='w', buffering=1)
-sys.stderr = open(sys.stderr.fileno(), mode='w', buffering=1)
+from debug_utils import debug_print, debug_error, debug_verbose, flush_logs, TokenEcho
+from sheet_writer import SheetWriter, WEB_APP_URL
+from job_server import serve
+from ingest import read_job, read_job_file
+from question_cache import QuestionCache
+from scoring_engine import ScoringEngine, DEFAULT_MODEL, ROW_PROMPT_VERSION, BATCH_PROMPT_VERSION, MULTI_PROMPT_VERSION
+from prompts import build_rubric, split_columns, COLUMNS_PER_QUESTION
+from ollama_client import OllamaClient
+from binary_question import convert_question
+from task_writer import TaskFileWriter
+from uploader import TaskUploader
+from job_store import JobStore, job_fingerprint, ADMITTED
+from pipeline import Pipeline, StageSkipped
+from prefilter import PhraseFilter
+from near_dup import NearDuplicateClusters
+from compression import TranscriptCompressor
+from results import ScoreTable, export_tables, NUMPY_AVAILABLE
+from result_cache import ResultCache
+from batching import iter_batches, estimate_tokens, DEFAULT_TOKEN_BUDGET, DEFAULT_MAX_ROWS
+from metrics import Metrics, METRICS, serve_metrics
+from outbound import OUTBOUND, INTERACTIVE, BULK, Throttled
 
-def debug_print(msg):
-    """Print debug messages to stdout (visible in Docker)"""
-    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    output = f"[{timestamp}] {msg}"
-    print(output, flush=True)
-    sys.stdout.flush()
+DEFAULT_SOCKET = "/tmp/async_processor.sock"
+TASK_DIR = os.environ.get('TASK_DIR', '/var/www/html/uploads')
+RESULTS_DIR = os.environ.get('RESULTS_DIR', TASK_DIR)
 
-def debug_error(msg):
-    """Print error messages to stderr (visible in Docker logs)"""
-    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    output = f"[ERROR {timestamp}] {msg}"
-    print(output, file=sys.stderr, flush=True)
-    sys.stderr.flush()
+_question_cache = None
 
-def write_data_to_file(data, filename_prefix="processed_data"):
+def load_data(sheet_id, sheet_name, text, row, column, writer=None):
     """
-    Write the received data to a file with timestamp
+    Write a single cell immediately through a SheetWriter
+    Prefer queueing several writes on one SheetWriter and flushing once
     """
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"{filename_prefix}_{timestamp}.json"  # FIXED: Removed extra space
-    
+    if writer is None:
+        writer = _default_writer()
+    writer.write(sheet_id, sheet_name, row, column, text)
+    # A single visible cell (status text) goes ahead of bulk score writes
+    responses = writer.flush(priority=INTERACTIVE)
+    return responses[0] if responses else "fail"
+
+_writer = None
+
+def _default_writer():
+    """Module-level SheetWriter so repeated load_data() calls share one pooled session"""
+    global _writer
+    if _writer is None:
+        _writer = SheetWriter()
+    return _writer
+
+def convert_question_to_binary_json(question, model, sheet_id, sheet_name, metrics=None):
+    """
+    Convert a question into binary decision format using Ollama API (see binary_question.py)
+    Args:
+        question: The question to convert
+        model: The Ollama model to use (default: deepseek-r1:7b)
+        metrics: Optional Metrics to record latency, time to first token, generation time and tokens/s
+    Returns:
+        list: [full model response, answer text with <think> blocks removed]
+    """
+    echo = TokenEcho()
     try:
-        debug_print(f"Writing data to file: {filename}")
-        with open(filename, 'w') as f:
-            json.dump(data, f, indent=2)
-        
-        # Also create a log entry
-        log_filename = "/var/www/html/uploads/processing_log.txt"
-        with open(log_filename, 'a') as log:
-            log.write(f"{timestamp} - Processed data written to {filename}\n")
-        
-        debug_print(f"Successfully wrote file: {filename}")
-        return filename
-    except Exception as e:
-        debug_error(f"Failed to write file: {str(e)}")
-        debug_error(f"Traceback: {traceback.format_exc()}")
-        error_log = "/var/www/html/uploads/error_log.txt"
-        try:
-            with open(error_log, 'a') as log:
-                log.write(f"{timestamp} - Error: {str(e)}\n{traceback.format_exc()}\n")
-        except Exception as write_err:
-            debug_error(f"Failed to write error log: {str(write_err)}")
+        answer = convert_question(question, model, client=_get_ollama_client(), cache=_get_question_cache(),
+                                  metrics=metrics, on_token=echo)
+    finally:
+        echo.flush()
+    if answer is None:
         return None
+    return [answer.full_response, answer.answer_text]
 
-def load_data(sheet_id, sheet_name, text, row, column):
-    try:
-        sheet_id_config = sheet_id
-        web_app_url = "https://script.google.com/macros/s/AKfycbyPWPxmGCoxjYp3fULvxk-ruXNRga6KDRNNQbTl_jvTCOacvy15nPPE-qWzN4iz3g4Q4g/exec"
-        
-        body = {
-            "sheet_id": sheet_id_config,
-            "sheet_name": sheet_name,
-            "row": row,
-            "column": column,
-            "value": text
-        }
-        
-        headers = {
-            "Content-Type": "application/json"
-        }
-        
-        debug_print(f"Google Apps Script URL: {web_app_url}")
-    except Exception as e:
-        debug_error(f"Failed to setup Google Sheets config: {str(e)}")
-        debug_error(f"Traceback: {traceback.format_exc()}")
+def _get_ollama_client():
+    """Process-wide OllamaClient so every job and scoring thread reuses pooled connections"""
+    global _ollama_client
+    if _ollama_client is None:
+        _ollama_client = OllamaClient(pool_size=int(os.environ.get('OLLAMA_POOL_SIZE', 8)))
+    return _ollama_client
+
+_ollama_client = None
+
+def _get_question_cache():
+    """Process-wide QuestionCache, shared by every job in --serve mode"""
+    global _question_cache
+    if _question_cache is None:
+        _question_cache = QuestionCache()
+    return _question_cache
+
+def _get_job_store():
+    """Process-wide JobStore, shared by every job in --serve mode"""
+    global _job_store
+    if _job_store is None:
+        _job_store = JobStore()
+    return _job_store
+
+_job_store = None
+
+def _get_result_cache():
+    """Process-wide ResultCache; entries from older models/prompts are dropped on first use"""
+    global _result_cache
+    if _result_cache is None:
+        _result_cache = ResultCache()
+        _result_cache.retain_only(DEFAULT_MODEL, {ROW_PROMPT_VERSION, BATCH_PROMPT_VERSION, MULTI_PROMPT_VERSION})
+    return _result_cache
+
+_result_cache = None
+
+def _update_job(job_id, **fields):
+    """Record job progress; a job store failure must never fail the job itself"""
+    if job_id is None:
         return
-    
-    web = ""
     try:
-        debug_print("Sending request to Google Apps Script...")
-        response = requests.post(web_app_url, data=json.dumps(body), headers=headers, timeout=10)
-        debug_print(f"Google Apps Script response status: {response.status_code}")
-        debug_print(f"Response text: {response.text}")
-        web = response.text
+        _get_job_store().update_job(job_id, **fields)
     except Exception as e:
-        debug_error(f"Failed to reach Google Apps Script: {str(e)}")
-        debug_error(f"Traceback: {traceback.format_exc()}")
-        web = "fail"
-    
-    return web
+        debug_error(f"Failed to update job {job_id}: {str(e)}")
 
-def convert_question_to_binary_json(question, model, sheet_id, sheet_name):
+def admit_job(data, metrics):
     """
-    Convert a question into binary decision format using Ollama API
-    Args:
-        question: The question to convert
-        model: The Ollama model to use (default: deepseek-r1:7b)
+    Fingerprint a job and check it against in-flight and recently finished ones
+    Window and stale timeout come from env JOB_DEDUP_WINDOW / JOB_DEDUP_STALE (seconds);
+    JOB_DEDUP=0 turns admission off and data['force'] bypasses it for one job
     Returns:
-        dict: JSON formatted binary decision
-    """
-    # Construct the prompt
-    prompt = f"""Convert this question into a binary decision format with details. Output as JSON only.
-but be sure to think about it this question will be used to rate a text
-in the case case where someone asked if a dog was important you might have
-binary_topic about dog
-positive_case yes a dog was talked about in the text.
-negative_case
-
-Original question: "{question}"
-
-Format as valid JSON:
-{{
-    "binary_topic": "[extracted core concept]",
-    "positive_case": "[details supporting this]",
-    "negative_case": "[details opposing this]",
-    "unknown": "[details about what could determine this]"
-}}
-
-Output only valid JSON, no explanation."""
-
-    # API endpoint for Ollama
-    url = "http://host.docker.internal:11434/api/generate"
-    
-    # Request payload
-    payload = {
-        "model": model,
-        "prompt": prompt,
-        "stream": True,
-        "options": {
-            "temperature": 0.1,
-            "num_predict": 2048
-        }
-    }
-    
+        tuple: (fingerprint, owner) if the job should run (owner None when not tracked),
+               or None if it is a duplicate
+    """
+    if data.get('force') or os.environ.get('JOB_DEDUP', '1') in ('', '0'):
+        return None, None
+    fingerprint = job_fingerprint(data)
     try:
-        # Make the API request with streaming
-        response = requests.post(url, json=payload, stream=True)
-        response.raise_for_status()
-        
-        full_response = ""
-        
-        print("\n" + "="*80)
-        print("RAW MODEL OUTPUT (STREAMING):")
-        print("="*80 + "\n")
-        
-        # Process the streaming response
-        for line in response.iter_lines():
-            if line:
-                chunk = json.loads(line)
-                token = chunk.get("response", "")
-                full_response += token
-                # Print each token as it comes
-                print(token, end="", flush=True)
-                
-                if chunk.get("done", False):
-                    break
-        
-        print("\n\n" + "="*80)
-        print("EXTRACTED THINKING PROCESS:")
-        print("="*80 + "\n")
-        
-        # Extract thinking from tags
-        think_matches = re.findall(r'<think>(.*?)</think>', full_response, re.DOTALL)
-        if think_matches:
-            for i, think in enumerate(think_matches, 1):
-                print(f"--- Thinking Block {i} ---\n")
-                print(think.strip())
-                print()
-        else:
-            print("No explicit thinking tags found in response.")
-        
-        print("\n" + "="*80)
-        print("FINAL ANSWER (JSON):")
-        print("="*80 + "\n")
-        
-        # Remove thinking tags to get clean JSON
-        answer_text = re.sub(r'<think>.*?</think>', '', full_response, flags=re.DOTALL).strip()
-        print(answer_text)
-        
-        return [full_response, answer_text]
-    
-    except requests.exceptions.RequestException as e:
-        print(f"\nError connecting to Ollama: {e}", file=sys.stderr)
-        return None
-    except json.JSONDecodeError as e:
-        print(f"\nError parsing JSON response: {e}", file=sys.stderr)
-        print(f"Raw response: {full_response}", file=sys.stderr)
-        return None
+        decision, owner = _get_job_store().admit(
+            fingerprint,
+            window=float(os.environ.get('JOB_DEDUP_WINDOW', 300)),
+            stale_after=float(os.environ.get('JOB_DEDUP_STALE', 3600))
+        )
+    except Exception as e:
+        # Never lose a job because the admission table is unavailable
+        debug_error(f"Job admission failed, running job anyway: {str(e)}")
+        return fingerprint, None
+    if decision == ADMITTED:
+        return fingerprint, owner
+    debug_print(f"Skipping duplicate job ({decision}) for {data.get('sheet_name', '')}: {fingerprint[:12]}")
+    metrics.incr('jobs_deduplicated', reason=decision)
+    print(json.dumps({'status': 'duplicate', 'reason': decision}))
+    return None
 
-def upload_file(task_filename):
+def upload_file(task_filename, job=None):
     """
-    Upload a file to the specified URL and return response details.
+    Upload a file to the scheduler and return response details.
+    The upload is queued behind other jobs' uploads in the outbound scheduler;
+    a 429 from the scheduler pauses uploads and the upload is retried (it resumes
+    from its manifest)
     
     Args:
         task_filename: Path to the file to upload
+        job: Key for fair queuing between jobs
         
     Returns:
         dict: Response details including success status, HTTP code, and JSON response
@@ -210,81 +173,247 @@ def upload_file(task_filename):
     Raises:
         FileNotFoundError: If the file doesn't exist
     """
-    url = "https://scheduler.slqmyadmin.com/upload"
-    file_path = task_filename
-    
-    # Check if file exists
-    if not os.path.exists(file_path):
-        raise FileNotFoundError(f"File does not exist: {file_path}")
+    global _uploader
+    if _uploader is None:
+        # 429s are retried by OUTBOUND only, so the uploader hands them straight back
+        _uploader = TaskUploader(retry_throttled=False)
+    last = {}
     
-    # Generate a random UUID
-    random_id = str(uuid.uuid4())
+    def _upload():
+        last['result'] = _uploader.upload(task_filename)
+        if not last['result']['success'] and last['result'].get('http_code') == 429:
+            raise Throttled("Scheduler HTTP 429")
+        return last['result']
     
-    # Open and upload the file
-    with open(file_path, 'rb') as file:
-        files = {'file': file}
-        response = requests.post(url, files=files)
+    try:
+        return OUTBOUND.call('scheduler', _upload, priority=BULK, job=job)
+    except Throttled:
+        return last['result']
+
+_uploader = None
+
+def scoring_mode(data):
+    """'task' (push a .task file to the scheduler, default) or 'local' (score in-process)"""
+    return data.get('scoring_mode') or os.environ.get('SCORING_MODE', 'task')
+
+def batch_budget(data, question):
+    """
+    Token budget left for transcripts in one batched local request, or 0 when batching is off
+    Set per job with data['batch_token_budget'] or globally with env BATCH_TOKEN_BUDGET;
+    the rating prompt sent with every batch is taken off the total
+    """
+    budget = int(data.get('batch_token_budget') or DEFAULT_TOKEN_BUDGET)
+    if budget <= 0:
+        return 0
+    return max(1, budget - estimate_tokens(question))
+
+def write_scores(sheet_writer, sheet_id, sheet_name, row, theCollum, scores):
+    """Queue one row's scores under the Not_About / About / Unknown header labels written by process_job()"""
+    sheet_writer.write(sheet_id, sheet_name, row, theCollum+1, scores.get('not_about', ''))
+    sheet_writer.write(sheet_id, sheet_name, row, theCollum+2, scores.get('about', ''))
+    sheet_writer.write(sheet_id, sheet_name, row, theCollum+3, scores.get('unknown', ''))
+
+def score_rows_locally(rows, question, write, result_cache=None, budget=0):
+    """
+    Score (text, row, column) rows against Ollama in-process and pass each row's scores to write(row, scores)
+    Fresh scores are stored in result_cache when one is given
+    With a token budget, rows are packed into multi-call requests (see batching.py)
+    """
+    items = (((row, str(text)), str(text)) for text, row, _ in rows)
     
-    # Get response details
-    http_code = response.status_code
+    engine = ScoringEngine(concurrency=int(os.environ.get('SCORING_CONCURRENCY', 4)), client=_get_ollama_client())
+    try:
+        if budget:
+            scored = engine.iter_batch_scores(question, iter_batches(items, budget, DEFAULT_MAX_ROWS, text=lambda item: item[1]))
+        else:
+            scored = engine.iter_scores(question, items)
+        # Rows stream from the input through the scorer into the batched sheet writes
+        for (row, text), scores in scored:
+            if not scores:
+                continue
+            write(row, scores)
+            if result_cache is not None:
+                # Under the version of the prompt that scored it: batched, or singly for what a batch missed
+                result_cache.put(text, question, engine.model, scores.version, scores)
+    finally:
+        engine.close()
+
+def score_questions_locally(rows, questions, write, result_cache=None):
+    """
+    Score (text, row, column) rows against several questions in-process, one
+    request per row, and pass each row's list of per-question scores to write(row, scores)
+    """
+    items = (((row, str(text)), str(text)) for text, row, _ in rows)
     
+    engine = ScoringEngine(concurrency=int(os.environ.get('SCORING_CONCURRENCY', 4)), client=_get_ollama_client())
+    try:
+        for (row, text), results in engine.iter_multi_scores(questions, items):
+            if not any(results):
+                continue
+            write(row, results)
+            if result_cache is not None:
+                for question, scores in zip(questions, results):
+                    if scores:
+                        # MULTI_PROMPT_VERSION, or ROW_PROMPT_VERSION for questions re-scored singly
+                        result_cache.put(text, question, engine.model, scores.version, scores)
+    finally:
+        engine.close()
+
+def cached_rows(rows, result_cache, question, write, versions=(ROW_PROMPT_VERSION,)):
+    """
+    Pass cached scores to write(row, scores) for (text, row, column) rows scored
+    before with the same rubric, model and one of the prompt versions, and yield only the misses
+    """
+    for text, row, column in rows:
+        scores = result_cache.get(str(text), question, DEFAULT_MODEL, versions)
+        if scores is None:
+            yield text, row, column
+        else:
+            write(row, scores)
+
+def cached_question_rows(rows, result_cache, questions, write):
+    """
+    cached_rows() for several questions: a row is only skipped when every
+    question has a cached score, which is passed to write(row, scores) as a list
+    Scores from the multi-question prompt and from single-question fallbacks both count
+    """
+    versions = (MULTI_PROMPT_VERSION, ROW_PROMPT_VERSION)
+    for text, row, column in rows:
+        results = [result_cache.get(str(text), question, DEFAULT_MODEL, versions) for question in questions]
+        if any(scores is None for scores in results):
+            yield text, row, column
+        else:
+            write(row, results)
+
+def build_phrase_filter(data, binary_json):
+    """
+    PhraseFilter for the job's binary_json, or None when the pre-filter is off
+    Enabled per job with data['prefilter'] or globally with env PREFILTER=1
+    """
+    enabled = data.get('prefilter', os.environ.get('PREFILTER', '')) not in ('', '0', False, None)
+    if not enabled:
+        return None
+    phrase_filter = PhraseFilter.from_binary_json(binary_json, min_hits=int(os.environ.get('PREFILTER_MIN_HITS', 2)))
+    debug_print(f"Pre-filter compiled {phrase_filter.phrase_count} phrase(s)")
+    return phrase_filter
+
+def prefilter_rows(rows, phrase_filter, write):
+    """
+    Pass scores to write(row, scores) for the (text, row, column) rows the phrase
+    filter can decide and yield only the ambiguous ones, which still need the model
+    """
+    for text, row, column in rows:
+        scores = phrase_filter.classify(text)
+        if scores is None:
+            yield text, row, column
+        else:
+            write(row, scores)
+
+def build_clusterer(data, in_process):
+    """
+    NearDuplicateClusters for the job, or None when near-duplicate detection is off
+    Enabled per job with data['near_dup'] or globally with env NEAR_DUP=1; in-process
+    scoring only, as the scheduler has no way to copy a representative's scores to its members
+    """
+    enabled = data.get('near_dup', os.environ.get('NEAR_DUP', '')) not in ('', '0', False, None)
+    if not enabled:
+        return None
+    if not in_process:
+        debug_print("Near-duplicate detection needs in-process scoring, sending every row to the scheduler")
+        return None
+    return NearDuplicateClusters(threshold=float(os.environ.get('NEAR_DUP_THRESHOLD', 0.8)))
+
+def build_compressor(data, binary_jsons):
+    """
+    TranscriptCompressor for the job's binary_json answers, indexed over every
+    row, or None when compression is off
+    Enabled per job with data['compress'] or globally with env COMPRESS=1;
+    COMPRESS_TOKEN_BUDGET caps the tokens sent per transcript
+    """
+    enabled = data.get('compress', os.environ.get('COMPRESS', '')) not in ('', '0', False, None)
+    if not enabled:
+        return None
+    compressor = TranscriptCompressor.from_binary_json(binary_jsons, int(os.environ.get('COMPRESS_TOKEN_BUDGET', 300)))
+    for text, _, _ in iter_task_rows(data, 0):
+        compressor.index_text(text)
+    debug_print(f"Compression index: {compressor.index.documents} window(s), query {compressor.query}")
+    return compressor
+
+def build_score_tables(data, topics):
+    """
+    One results.ScoreTable per question covering every data row, or None to
+    write scores cell by cell (no numpy, or env RESULTS_TABLE=0)
+    """
+    if not NUMPY_AVAILABLE or os.environ.get('RESULTS_TABLE', '1') in ('', '0'):
+        return None
+    first_row = min(data['rows']) + 1
+    return [ScoreTable(first_row, len(data['allRowsData']) - 1, topic) for topic in topics]
+
+def iter_task_rows(data, column):
+    """
+    Yield (text, row, column) for every selected row after the first
+    The first selected row holds the header labels written by process_job()
+    allRowsData may be a list or an ingest.RowSpool; it is read once, in order
+    """
+    all_rows_data = iter(data['allRowsData'])
+    first = next(all_rows_data, None)
+    if first is None:
+        return
+    first_field = list(first['_columns'].keys())[0]
+    first_row = min(data['rows'])
+    for x, row_data in enumerate(all_rows_data, 1):
+        yield row_data[first_field], first_row+x, column
+
+def read_job_input(stream=None, path=None):
+    """
+    Read and parse one job payload from a stream or a file path
+    allRowsData is parsed incrementally and spooled to disk (see ingest.py)
+    Returns:
+        dict: The parsed job, or None if it was empty or invalid
+    """
     try:
-        json_response = response.json()
-    except requests.exceptions.JSONDecodeError:
-        json_response = None
+        debug_print("Parsing job input...")
+        with METRICS.timer('ingest'):
+            data = read_job_file(path) if path else read_job(stream)
+    except (OSError, UnicodeDecodeError) as e:
+        debug_error(f"Failed to read job input: {str(e)}")
+        debug_error(f"Traceback: {traceback.format_exc()}")
+        return None
+    except ValueError as e:
+        debug_error(f"JSON parsing error: {str(e)}")
+        debug_error(f"Traceback: {traceback.format_exc()}")
+        return None
+    
+    if data is None:
+        debug_error("No input data received from PHP")
+        print(json.dumps({'status': 'error', 'message': 'No input data'}))
+        return None
     
-    return {
-        'success': True,
-        'http_code': http_code,
-        'response': json_response,
-        'task_file': task_filename,
-        'random_id': random_id
-    }
+    debug_print(f"Received input data (length: {data.pop('_input_bytes', 0)} bytes, {len(data['allRowsData'])} rows)")
+    return data
 
-def main():
+def process_job(data):
     """
-    Main function to receive data from stdin and process it
+    Process one job payload sent from PHP (question.php)
+    Used both by the one-shot stdin mode and by the --serve worker pool
+
+    The work runs as a pipeline: the status cell write and the job store
+    save overlap the LLM call, and each later stage starts as soon as the
+    stages it needs have finished
     """
-    # FIXED: Initialize variables at the start to avoid scope issues
-    question = ''
-    sheet_id = ''
-    sheet_name = ''
-    output_data = None
-    task_filename = None
+    sheet_writer = SheetWriter()
+    job_metrics = Metrics()
+    job_started = time.perf_counter()
+    admission = None
+    failed = True
     
     try:
-        debug_print("=== STARTING PYTHON PROCESSOR ===")
-        debug_print("Waiting for data from PHP...")
-        
-        # Read data from stdin (sent from PHP)
-        try:
-            input_data = sys.stdin.read()
-            debug_print(f"Received input data (length: {len(input_data)} bytes)")
-            debug_print(f"Received input data {input_data}")
-        except Exception as e:
-            debug_error(f"Failed to read from stdin: {str(e)}")
-            debug_error(f"Traceback: {traceback.format_exc()}")
-            return
-        
-        if not input_data:
-            debug_error("No input data received from PHP")
-            print(json.dumps({'status': 'error', 'message': 'No input data'}))
-            return
-        
-        # Parse JSON data
-        try:
-            debug_print("Parsing JSON data...")
-            data = json.loads(input_data)
-            debug_print("JSON parsed successfully")
-        except json.JSONDecodeError as e:
-            debug_error(f"JSON parsing error: {str(e)}")
-            debug_error(f"Input was: {input_data[:200]}...")
-            debug_error(f"Traceback: {traceback.format_exc()}")
-            return
-        
         # Extract components
         try:
             question = data.get('question', '')
+            # Several questions rate the same rows together, one request per row (see prompts.py)
+            questions = [q for q in data.get('questions') or [] if q] or [question]
+            question = questions[0]
             sheet_id = data.get('sheet_id', '')
             sheet_name = data.get('sheet_name', '')
             rows = data.get('rows', [])
@@ -295,6 +424,8 @@ def main():
             
             debug_print(f"Extracted data:")
             debug_print(f" - Question: {question[:50] if question else 'None'}")
+            if len(questions) > 1:
+                debug_print(f" - Questions: {len(questions)}")
             debug_print(f" - Sheet: {sheet_name}")
             debug_print(f" - Rows data: {len(all_rows_data)} entries")
             debug_print(f" - Selected columns: {selected_columns}")
@@ -303,133 +434,357 @@ def main():
             debug_error(f"Traceback: {traceback.format_exc()}")
             return
         
+        # Identical submissions (double clicks) run once
+        admission = admit_job(data, job_metrics)
+        if admission is None:
+            failed = False
+            return
+        
         # Google Sheets configuration
-        print()
-        print()
-        print()
-        print()
         first_field = list(data['allRowsData'][0]['_columns'].keys())[0]
         theCollum= data['allRowsData'][0]['_columns'][first_field]['number'] 
-        web = load_data(sheet_id, sheet_name, "loaded python", max(data['rows'])+1, theCollum )
+        header_row = max(data['rows'])+1
+        label_row = min(data['rows'])
         
         # Create a structured output
-        try:
-            output_data = {
-                'timestamp': datetime.now().isoformat(),
-                'question': question,
-                'sheet_id': sheet_id,
-                'sheet_name': sheet_name,
-                'rows': rows,
-                'row_count': len(all_rows_data),
-                'data': all_rows_data,
-                'selected_columns': selected_columns,
-                'start_column': start_column,
-                'num_columns': num_columns,
-                'response': web,
-                'column_selection_info': {
-                    'column_names': selected_columns,
-                    'start_column_index': start_column,
-                    'number_of_columns': num_columns
-                }
+        output_data = {
+            'timestamp': datetime.now().isoformat(),
+            'question': question,
+            'questions': questions,
+            'sheet_id': sheet_id,
+            'sheet_name': sheet_name,
+            'rows': rows,
+            'row_count': len(all_rows_data),
+            'data': all_rows_data,
+            'selected_columns': selected_columns,
+            'start_column': start_column,
+            'num_columns': num_columns,
+            'column_selection_info': {
+                'column_names': selected_columns,
+                'start_column_index': start_column,
+                'number_of_columns': num_columns
             }
-            debug_print("Output data prepared successfully")
-        except Exception as e:
-            debug_error(f"Failed to prepare output data: {str(e)}")
-            debug_error(f"Traceback: {traceback.format_exc()}")
-            return
-        
-        # Write to file
-        try:
-            debug_print("Writing processed data to file...")
-            filename = write_data_to_file(output_data)
-            if filename:
-                debug_print(f"Processing completed successfully!")
-                debug_print(f"Output file: {filename}")
-                print(json.dumps({'status': 'success', 'file': filename}))
-            else:
-                debug_error("Failed to write output file - filename is None")
-                print(json.dumps({'status': 'error', 'message': 'Failed to write file'}))
-        except Exception as e:
-            debug_error(f"Failed during file writing: {str(e)}")
-            debug_error(f"Traceback: {traceback.format_exc()}")
-        
-        # FIXED: Moved processing logic from finally to try block
-        result = convert_question_to_binary_json(question, "deepseek-r1:7b", sheet_id, sheet_name)
-        
-        if result is None:
-            debug_error("Failed to convert question to binary JSON")
-            return
-        
-        print()
-        print("json new 1")
-        print()
-        print(result)
-        print("json")
-        
-        s = result[1]
-        start = s.find('{')
-        end = s.rfind('}')
-        resultjson = s[start:end+1] if start != -1 and end != -1 else s
-        
-        load_data(sheet_id, sheet_name, str(result), max(data['rows']) +1, theCollum+3)
-
-        
-        print()
-        print("json out")
-        print(resultjson)
-        print("json out")
-        
-        binary_json = json.loads(resultjson)
-        print(binary_json)
-        print("loaded data")
-        
-        load_data(sheet_id, sheet_name, str(binary_json['binary_topic']), max(data['rows'])+1 , theCollum+1)
-        load_data(sheet_id, sheet_name, str("Not_About_"+binary_json['binary_topic']), min(data['rows']), theCollum+1 )
-        load_data(sheet_id, sheet_name, str("About_"+binary_json['binary_topic']), min(data['rows']), theCollum+2  )
-        load_data(sheet_id, sheet_name, str("Unknown"), min(data['rows']), theCollum+3 )
-        
-        binary_json['binary_topic'] = binary_json['binary_topic'].strip(" ")
+        }
         
-        try:
-            if (binary_json['unknown'] == None):
+        def stage(name, index):
+            """Stage name for question index; the first question's stages keep the plain names"""
+            return name if index == 0 else f"{name}_{index+1}"
+        
+        def write_status(results):
+            return load_data(sheet_id, sheet_name, "loaded python", header_row, theCollum, writer=sheet_writer)
+        
+        def save_job(results):
+            job_id = _get_job_store().save_job(output_data)
+            debug_print(f"Job id: {job_id}")
+            print(json.dumps({'status': 'success', 'job_id': job_id}))
+            return job_id
+        
+        def convert(results, index=0):
+            result = convert_question_to_binary_json(questions[index], "deepseek-r1:7b", sheet_id, sheet_name, metrics=job_metrics)
+            if result is None:
+                raise RuntimeError("Failed to convert question to binary JSON")
+            # Sent with the header labels below (or when the job finishes if parsing fails)
+            sheet_writer.write(sheet_id, sheet_name, header_row, theCollum+COLUMNS_PER_QUESTION*index+3, str(result))
+            return result
+        
+        def parse_answer(results, index=0):
+            s = results[stage('convert', index)][1]
+            start = s.find('{')
+            end = s.rfind('}')
+            resultjson = s[start:end+1] if start != -1 and end != -1 else s
+            
+            debug_verbose(f"json out {resultjson}")
+            
+            binary_json = json.loads(resultjson)
+            binary_json['binary_topic'] = binary_json['binary_topic'].strip(" ")
+            
+            try:
+                if (binary_json['unknown'] == None):
+                    binary_json['unknown'] = "Cant Tell"
+            except:
                 binary_json['unknown'] = "Cant Tell"
-        except:
-            binary_json['unknown'] = "Cant Tell"
-        
-        question = "Rate these calls by About_"+binary_json['binary_topic']+"_float is ( "+binary_json['positive_case']+" ) Not_About_"+binary_json['binary_topic']+" ( "+binary_json['negative_case']+" ) Unknown_float ("+binary_json['unknown']+") This is the call be sure to rate with a float make sure not all of them are 0 please make sure to rate right"
-        
-        load_data(sheet_id, sheet_name, question, max(data['rows']) +1 , theCollum+2)
-        
-        # FIXED: Save the CSV filename to task_filename variable
-        task_filename = '/var/www/html/uploads/2output'+str(uuid.uuid4())+'.task'
-        
-        # Create CSV file
-        with open(task_filename, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
             
-            for x in range(1,output_data['row_count']):
-                server = "https://script.google.com/macros/s/AKfycbyPWPxmGCoxjYp3fULvxk-ruXNRga6KDRNNQbTl_jvTCOacvy15nPPE-qWzN4iz3g4Q4g/exec"
-                first_field = list(data['allRowsData'][x]['_columns'].keys())[0]
-                text = data['allRowsData'][x][first_field]
-                row = min(data['rows'])+x
-                column = theCollum+1
-                topic = binary_json['binary_topic']
-                
-                json_str = '{ "server":"'+str(server)+'", "Text": "'+str( text )+'", "question": "'+str(question)+'","sheet_id": "'+str(sheet_id)+'","sheet_name": "'+str(sheet_name)+'","row": '+str(row)+',"column": '+str(column)+' ,"topic":"'+str(topic)+'"}'
-                print(json_str)
-                writer.writerow([json_str, "CallBackTest", "testing"])
-        
-        # FIXED: Now task_filename is defined before use
-        upload_result = upload_file(task_filename)
-        debug_print(f"Upload result: {upload_result}")
+            rating_question = build_rubric(binary_json)
+            return binary_json, resultjson, rating_question
+        
+        def write_headers(results, index=0):
+            binary_json, _, rating_question = results[stage('parse_answer', index)]
+            topic = binary_json['binary_topic']
+            column = theCollum + COLUMNS_PER_QUESTION*index
+            sheet_writer.write(sheet_id, sheet_name, header_row, column+1, str(topic))
+            sheet_writer.write(sheet_id, sheet_name, label_row, column+1, str("Not_About_"+topic))
+            sheet_writer.write(sheet_id, sheet_name, label_row, column+2, str("About_"+topic))
+            sheet_writer.write(sheet_id, sheet_name, label_row, column+3, str("Unknown"))
+            sheet_writer.write(sheet_id, sheet_name, header_row, column+2, rating_question)
+            return sheet_writer.flush(priority=INTERACTIVE)
+        
+        def record_answer(results):
+            _update_job(results['save_job'], llm_output=results['parse_answer'][1])
+        
+        def build_tasks(results):
+            answers = [results[stage('parse_answer', index)] for index in range(len(questions))]
+            binary_json, _, rating_question = answers[0]
+            rubrics = [answer[2] for answer in answers]
+            result_cache = _get_result_cache()
+            hits_before, misses_before = result_cache.hits, result_cache.misses
+            # Scored entirely in-process: collect the scores and write them as one block at the end
+            in_process = len(rubrics) > 1 or scoring_mode(data) == 'local'
+            clusters = build_clusterer(data, in_process)
+            tables = build_score_tables(data, [answer[0]['binary_topic'] for answer in answers]) if in_process else None
+            
+            def write_cells(row, scores):
+                # One scores dict per question, each in its own block of columns
+                results = scores if len(rubrics) > 1 else [scores]
+                if tables is not None:
+                    for table, question_scores in zip(tables, results):
+                        if question_scores:
+                            table.add(row, question_scores)
+                    return
+                for column, question_scores in split_columns(theCollum, results):
+                    write_scores(sheet_writer, sheet_id, sheet_name, row, column, question_scores)
+            
+            def write(row, scores):
+                write_cells(row, scores)
+                if clusters is not None:
+                    clusters.record(row, scores)
+            
+            # Near-duplicates collapse to one representative, then earlier model results
+            # and the phrase pre-filter; only what is left needs scoring
+            rows = iter_task_rows(data, theCollum+1)
+            if clusters is not None:
+                rows = clusters.representatives(rows)
+            phrase_filter = build_phrase_filter(data, binary_json) if len(rubrics) == 1 else None
+            compressor = build_compressor(data, [answer[0] for answer in answers])
+            if compressor is not None:
+                # The pre-filter looks for phrases anywhere in the call, so it runs on the full
+                # text; cached scores are keyed on the compressed text the model is sent
+                if phrase_filter is not None:
+                    rows = prefilter_rows(rows, phrase_filter, write)
+                rows = compressor.compress_rows(rows)
+            if len(rubrics) > 1:
+                rows = cached_question_rows(rows, result_cache, rubrics, write)
+            else:
+                # Batched local scoring stores batch scores, plus single-row scores for what a batch missed
+                batched = scoring_mode(data) == 'local' and batch_budget(data, rating_question)
+                rows = cached_rows(rows, result_cache, rating_question, write,
+                                   (BATCH_PROMPT_VERSION, ROW_PROMPT_VERSION) if batched else (ROW_PROMPT_VERSION,))
+                if phrase_filter is not None and compressor is None:
+                    rows = prefilter_rows(rows, phrase_filter, write)
+            try:
+                if len(rubrics) > 1:
+                    # Task rows carry one question each, so several questions are always scored here
+                    score_questions_locally(rows, rubrics, write, result_cache=result_cache)
+                    fan_out(clusters, write_cells)
+                    publish_tables(tables)
+                    sheet_writer.flush()
+                    return None
+                if scoring_mode(data) == 'local':
+                    score_rows_locally(rows, rating_question, write,
+                                       result_cache=result_cache, budget=batch_budget(data, rating_question))
+                    fan_out(clusters, write_cells)
+                    publish_tables(tables)
+                    sheet_writer.flush()
+                    return None
+                return write_task_file(rows, binary_json, rating_question)
+            finally:
+                if compressor is not None:
+                    debug_print(f"Compression: {compressor.compressed}/{compressor.texts} transcript(s) cut to "
+                                f"{compressor.budget} tokens, {compressor.tokens_in} -> {compressor.tokens_out} tokens "
+                                f"(ratio {compressor.ratio:.2f})")
+                    job_metrics.incr('compressed_rows', compressor.compressed)
+                    job_metrics.set('compression_ratio', round(compressor.ratio, 4))
+                if clusters is not None:
+                    debug_print(f"Near-duplicates: {clusters.rows} row(s) in {len(clusters.members)} cluster(s), "
+                                f"{clusters.duplicates} LLM call(s) saved")
+                    job_metrics.incr('near_duplicate_rows', clusters.duplicates)
+                    job_metrics.incr('llm_calls_saved', clusters.duplicates)
+                hits = result_cache.hits - hits_before
+                misses = result_cache.misses - misses_before
+                debug_print(f"Result cache: {hits} hit(s), {misses} miss(es) {result_cache.stats()}")
+                job_metrics.incr('result_cache_hits', hits)
+                job_metrics.incr('result_cache_misses', misses)
+                job_metrics.set('result_cache_hit_rate', round(result_cache.stats()['hit_rate'], 4))
+                if phrase_filter is not None:
+                    debug_print(f"Pre-filter decided {phrase_filter.decided}/{phrase_filter.checked} row(s), "
+                                f"{phrase_filter.decided} LLM call(s) saved")
+                    job_metrics.incr('prefilter_rows', phrase_filter.checked)
+                    job_metrics.incr('llm_calls_saved', phrase_filter.decided)
+        
+        def publish_tables(tables):
+            """Validate and renormalize every question's scores in bulk, then write each run of scored rows as a range"""
+            if tables is None:
+                return
+            ranges = []
+            for index, table in enumerate(tables):
+                started = time.perf_counter()
+                summary = table.process()
+                job_metrics.observe('results_postprocess', time.perf_counter() - started)
+                ranges.extend((first_row, theCollum+COLUMNS_PER_QUESTION*index+1, values) for first_row, values in table.runs())
+                debug_print(f"Results for {table.topic}: {summary['scored']}/{summary['rows']} row(s) scored, "
+                            f"{summary['renormalized']} renormalized, {summary['invalid']} invalid, "
+                            f"{summary['degenerate']} degenerate", summary=summary)
+                question = str(index+1)
+                job_metrics.incr('results_rows', summary['scored'], question=question)
+                job_metrics.incr('results_renormalized', summary['renormalized'], question=question)
+                job_metrics.incr('results_invalid', summary['invalid'], question=question)
+                job_metrics.incr('results_degenerate', summary['degenerate'], question=question)
+                for key, mean in summary['mean'].items():
+                    job_metrics.set('results_mean', mean, question=question, score=key)
+            # Every question's runs in one POST; rows left unscored keep whatever their cells held
+            sheet_writer.write_ranges(sheet_id, sheet_name, ranges)
+            export = os.environ.get('RESULTS_EXPORT', '')
+            if export:
+                path = export_tables(tables, os.path.join(RESULTS_DIR, 'results-'+str(uuid.uuid4())+'.csv'), export)
+                debug_print(f"Exported results to {path}")
+        
+        def fan_out(clusters, write_cells):
+            if clusters is None:
+                return
+            for row, scores in clusters.fan_out():
+                write_cells(row, scores)
+        
+        def write_task_file(rows, binary_json, rating_question):
+            task_filename = os.path.join(TASK_DIR, '2output'+str(uuid.uuid4())+'.task')
+            envelope = {
+                "server": WEB_APP_URL,
+                "question": rating_question,
+                "sheet_id": sheet_id,
+                "sheet_name": sheet_name,
+                "topic": binary_json['binary_topic']
+            }
+            compress = os.environ.get('TASK_GZIP', '') not in ('', '0')
+            format_version = int(os.environ.get('TASK_FORMAT', 1))
+            
+            # One row per transcript: the scheduler's CallBackTest reads a single Text, so batching is local-only
+            with TaskFileWriter(task_filename, envelope, compress=compress, format_version=format_version) as task_writer:
+                task_writer.write_rows(rows)
+            debug_print(f"Wrote {task_writer.rows_written} task row(s) to {task_writer.path}")
+            if task_writer.rows_written == 0:
+                # Every row was decided without the model; nothing to schedule
+                os.remove(task_writer.path)
+                return None
+            return task_writer.path
+        
+        def upload(results):
+            task_filename = results['build_tasks']
+            if task_filename is None:
+                return None
+            upload_result = upload_file(task_filename, job=id(sheet_writer))
+            debug_print(f"Upload result: {upload_result}")
+            job_metrics.incr('upload_bytes', upload_result.get('bytes', 0))
+            job_metrics.observe('upload', upload_result.get('seconds', 0.0))
+            return upload_result
+        
+        def record_upload(results):
+            upload_result = results['upload']
+            if upload_result is None:
+                _update_job(results['save_job'], status='scored')
+            else:
+                _update_job(results['save_job'], task_file=upload_result['task_file'],
+                            status='uploaded' if upload_result['success'] else 'upload_failed')
+        
+        pipeline = Pipeline(name=f"job {sheet_name}")
+        pipeline.add('write_status', write_status)
+        pipeline.add('save_job', save_job)
+        for index in range(len(questions)):
+            pipeline.add(stage('convert', index), functools.partial(convert, index=index))
+            pipeline.add(stage('parse_answer', index), functools.partial(parse_answer, index=index),
+                         after=(stage('convert', index),))
+            pipeline.add(stage('write_headers', index), functools.partial(write_headers, index=index),
+                         after=(stage('parse_answer', index),))
+        pipeline.add('record_answer', record_answer, after=('save_job', 'parse_answer'))
+        pipeline.add('build_tasks', build_tasks,
+                     after=tuple(stage('parse_answer', index) for index in range(len(questions))))
+        pipeline.add('upload', upload, after=('build_tasks',))
+        pipeline.add('record_upload', record_upload, after=('save_job', 'upload'))
+        pipeline.run_sync()
+        pipeline.report()
+        for name, (start, end) in pipeline.timings.items():
+            job_metrics.observe('stage', end - start, stage=name)
+        
+        failed = any(not isinstance(error, StageSkipped) for error in pipeline.errors.values())
+        upload_result = pipeline.results.get('upload')
+        if upload_result is not None and upload_result.get('success') is False:
+            # Nothing will come back from the scheduler, so a resubmission must run again
+            failed = True
+        for name, error in pipeline.errors.items():
+            if not isinstance(error, StageSkipped):
+                debug_error(f"Stage {name} failed: {str(error)}")
+                debug_error(f"Traceback: {''.join(traceback.format_exception(error))}")
+                print(json.dumps({'status': 'error', 'stage': name, 'message': str(error)}))
     
     except Exception as e:
-        debug_error(f"Unexpected error in main: {str(e)}")
+        debug_error(f"Unexpected error in job: {str(e)}")
         debug_error(f"Traceback: {traceback.format_exc()}")
         print(json.dumps({'status': 'error', 'message': str(e)}))
     
+    finally:
+        if admission is not None and admission[1] is not None:
+            try:
+                _get_job_store().release(admission[0], admission[1], completed=not failed)
+            except Exception as e:
+                debug_error(f"Failed to release job admission: {str(e)}")
+        sheet_writer.close()
+        spool = data.get('allRowsData')
+        if hasattr(spool, 'close'):
+            spool.close()
+        job_metrics.incr('jobs')
+        job_metrics.incr('sheets_round_trips', sheet_writer.round_trips)
+        job_metrics.observe('job', time.perf_counter() - job_started)
+        debug_print("Job metrics", metrics=job_metrics.snapshot())
+        METRICS.merge(job_metrics)
+        METRICS.write()
+        flush_logs()
+
+def main():
+    """
+    Main function to receive data from stdin and process it
+    Run with --serve to start the persistent worker daemon instead
+    """
+    args = parse_args()
+    if args.serve:
+        _get_job_store().start_compaction()
+        # Load the model before the first job arrives instead of during it
+        warm_models = [model.strip() for model in os.environ.get('OLLAMA_WARM_MODELS', DEFAULT_MODEL).split(',') if model.strip()]
+        _get_ollama_client().warm_up_async(warm_models)
+        if args.metrics_port:
+            serve_metrics(args.metrics_port)
+        serve(process_job, args.socket, args.workers, args.queue_size, read_job=read_job)
+        return
+    
+    try:
+        debug_print("=== STARTING PYTHON PROCESSOR ===")
+        debug_print("Waiting for data from PHP...")
+        
+        try:
+            data = read_job_input(sys.stdin, path=args.input)
+        finally:
+            if args.input and args.remove_input and os.path.exists(args.input):
+                os.remove(args.input)
+        if data is None:
+            return
+        process_job(data)
+    
     finally:
         debug_print("=== PYTHON PROCESSOR FINISHED ===\n")
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Process question jobs sent from question.php")
+    parser.add_argument('--serve', action='store_true',
+                        help="Run as a long-lived worker daemon listening on a Unix socket")
+    parser.add_argument('--socket', default=os.environ.get('PROCESSOR_SOCKET', DEFAULT_SOCKET),
+                        help="Unix socket path for --serve")
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('PROCESSOR_WORKERS', 2)),
+                        help="Number of jobs processed concurrently in --serve mode")
+    parser.add_argument('--queue-size', type=int, default=int(os.environ.get('PROCESSOR_QUEUE_SIZE', 20)),
+                        help="Jobs allowed to wait before new ones are rejected as busy")
+    parser.add_argument('--input',
+                        help="Read the job from this JSON/NDJSON file instead of stdin")
+    parser.add_argument('--remove-input', action='store_true',
+                        help="Delete the --input file once it has been read")
+    parser.add_argument('--metrics-port', type=int, default=int(os.environ.get('METRICS_PORT', 0)),
+                        help="Serve /metrics and /metrics.json on this localhost port in --serve mode")
+    return parser.parse_args()
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+batching.py - Token-budget batching of transcripts per LLM request
+Instead of a fixed number of rows per request, rows are packed so each
+batch fills a token budget: short calls share a request and a long call
+gets one to itself instead of overflowing the model context.
+
+Packing is first-fit-decreasing over a window of rows at a time, so a
+streamed sheet is never held in memory as a whole. Every batch keeps the
+original (text, row, column) tuples, so results map back to their cells.
+"""
+
+import math
+import os
+
+# Rough average for English transcripts with the deepseek/llama tokenizers
+CHARS_PER_TOKEN = 4
+
+DEFAULT_TOKEN_BUDGET = int(os.environ.get('BATCH_TOKEN_BUDGET', 0))
+DEFAULT_MAX_ROWS = int(os.environ.get('BATCH_MAX_ROWS', 0))
+
+def estimate_tokens(text):
+    """Approximate token count of a text (never less than 1)"""
+    return max(1, math.ceil(len(str(text)) / CHARS_PER_TOKEN))
+
+class Batch:
+    """Rows packed into one request, with their summed token estimate"""
+
+    def __init__(self):
+        self.items = []
+        self.tokens = 0
+
+    def add(self, item, tokens):
+        self.items.append(item)
+        self.tokens += tokens
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+def pack(items, budget, max_rows=None, text=lambda item: item[0]):
+    """
+    First-fit-decreasing bin packing of items into batches of at most budget tokens
+
+    Args:
+        items: Iterable of rows, e.g. (text, row, column) tuples
+        budget: Token budget per batch; an item over budget gets a batch to itself
+        max_rows: Optional cap on items per batch
+        text: Function returning the text of an item
+    Returns:
+        list: Batches, in order of their first (largest) item; items keep
+              their input order within each batch
+    """
+    sized = [(estimate_tokens(text(item)), position, item) for position, item in enumerate(items)]
+    sized.sort(key=lambda entry: entry[0], reverse=True)
+
+    batches = []
+    for tokens, position, item in sized:
+        for batch in batches:
+            if batch.tokens + tokens <= budget and (not max_rows or len(batch) < max_rows):
+                batch.add((position, item), tokens)
+                break
+        else:
+            batch = Batch()
+            batch.add((position, item), tokens)
+            batches.append(batch)
+
+    for batch in batches:
+        batch.items = [item for _, item in sorted(batch.items, key=lambda entry: entry[0])]
+    return batches
+
+def iter_batches(items, budget=DEFAULT_TOKEN_BUDGET, max_rows=DEFAULT_MAX_ROWS, window=1000,
+                 text=lambda item: item[0]):
+    """
+    Yield batches from a (possibly streamed) iterable, packing window items at a time
+    """
+    pending = []
+    for item in items:
+        pending.append(item)
+        if len(pending) >= window:
+            yield from pack(pending, budget, max_rows, text)
+            pending = []
+    if pending:
+        yield from pack(pending, budget, max_rows, text)
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+bench.py - Benchmark async_processor.py against local stand-in servers
+Starts fake Ollama / Apps Script / scheduler servers (fake_servers.py),
+builds job payloads from uploads/processed_data_*.json scaled to --rows
+rows, and reports jobs/s, p50/p99 latency, peak RSS and bytes uploaded for
+process_job() (main), the file/streaming input path (ingest), load_data,
+convert_question_to_binary_json and upload_file; compress is main with
+relevance-windowed compression (compression.py) switched on, followed by
+a comparison of full-text and compressed scoring. new_tokens counts the
+prompt tokens Ollama would evaluate after KV prefix reuse (see FakeOllama);
+tokens_per_cell divides them by the sheet cells written.
+
+With --questions N every job rates its rows on N questions, either in one
+job with a multi-question prompt per row (--question-mode multi) or as N
+single-question jobs (separate), which re-send every transcript per question.
+
+Usage:
+    python3 benchmarks/bench.py --rows 10000 --jobs 5 --latency 0.05 --jitter 0.02
+    python3 benchmarks/bench.py --scenarios convert,upload --json results.json
+    SCORING_MODE=local python3 benchmarks/bench.py --scenarios main --questions 3 --question-mode separate
+    python3 benchmarks/bench.py --scenarios main,compress --ollama-url http://localhost:11434/api/generate
+"""
+
+import argparse
+import glob
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from fake_servers import Latency, FakeOllama, FakeAppsScript, FakeScheduler
+
+SCENARIOS = ('main', 'ingest', 'load_data', 'convert', 'upload', 'compress')
+
+def load_jobs(pattern, rows):
+    """
+    Turn stored processed_data dumps into process_job() payloads with `rows` data rows each
+    Rows are cycled to reach the requested size
+    """
+    jobs = []
+    for path in sorted(glob.glob(pattern)):
+        with open(path, 'r') as f:
+            dump = json.load(f)
+        source_rows = [row for row in dump.get('data', []) if isinstance(row, dict)]
+        if not source_rows:
+            continue
+        fields = [name for name in source_rows[0] if name not in ('row_number', '_columns')]
+        if not fields:
+            continue
+        columns = {name: {'number': index + 2} for index, name in enumerate(fields)}
+        first_row = 2
+        all_rows_data = []
+        # One extra row: the first selected row carries the header labels
+        for index in range(rows + 1):
+            row = dict(source_rows[index % len(source_rows)])
+            row['row_number'] = first_row + index
+            row['_columns'] = columns
+            all_rows_data.append(row)
+        jobs.append({
+            'question': dump.get('question') or 'did they talk about pricing',
+            'sheet_id': dump.get('sheet_id', 'bench-sheet'),
+            'sheet_name': dump.get('sheet_name', 'bench'),
+            'rows': [row['row_number'] for row in all_rows_data],
+            'allRowsData': all_rows_data,
+            'selected_columns': fields,
+            'start_column': 2,
+            'num_columns': len(fields)
+        })
+    return jobs
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+def run_scenario(name, calls, fn, scheduler, ollama, sheets):
+    """Call fn(i) for i in range(calls) and summarize latency/throughput"""
+    latencies = []
+    bytes_before = scheduler.bytes_received
+    tokens_before = ollama.new_prompt_tokens
+    cells_before = sheets.cells
+    started = time.perf_counter()
+    for i in range(calls):
+        call_started = time.perf_counter()
+        fn(i)
+        latencies.append(time.perf_counter() - call_started)
+    wall = time.perf_counter() - started
+    new_tokens = ollama.new_prompt_tokens - tokens_before
+    cells = sheets.cells - cells_before
+    return {
+        'scenario': name,
+        'calls': calls,
+        'jobs_per_s': round(calls / wall, 3) if wall else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'bytes_uploaded': scheduler.bytes_received - bytes_before,
+        'new_tokens': new_tokens,
+        'tokens_per_cell': round(new_tokens / cells, 1) if cells else 0.0
+    }
+
+def compare_compression(async_processor, job, url, budget):
+    """
+    Score every row of job on its full text and on its compressed text
+
+    Returns:
+        dict: Rows, rows compressed, token ratio, how often both texts get the
+        same highest score (agreement) and the mean absolute difference of
+        the About score. The fake Ollama answers every row the same, so the
+        accuracy figures only mean something against a real server (--ollama-url)
+    """
+    from binary_question import convert_question
+    from compression import TranscriptCompressor
+    from ollama_client import OllamaClient
+    from prompts import build_rubric
+    from scoring_engine import ScoringEngine
+
+    client = OllamaClient(url)
+    binary_json = convert_question(job['question'], client=client).result
+    binary_json['unknown'] = binary_json.get('unknown') or "Cant Tell"
+    rubric = build_rubric(binary_json)
+    texts = [str(text) for text, _, _ in async_processor.iter_task_rows(job, 0)]
+    compressor = TranscriptCompressor.from_binary_json([binary_json], budget)
+    for text in texts:
+        compressor.index_text(text)
+    compressed = [compressor.compress(text) for text in texts]
+
+    engine = ScoringEngine(client=client)
+    try:
+        pairs = [(full, short) for full, short in zip(engine.score_rows(rubric, texts), engine.score_rows(rubric, compressed))
+                 if full and short]
+    finally:
+        engine.close()
+        client.close()
+    agreement = sum(1 for full, short in pairs if max(full, key=full.get) == max(short, key=short.get))
+    error = sum(abs(full.get('about', 0.0) - short.get('about', 0.0)) for full, short in pairs)
+    return {
+        'rows': len(texts),
+        'compressed': compressor.compressed,
+        'ratio': round(compressor.ratio, 3),
+        'agreement': round(agreement / len(pairs), 3) if pairs else 0.0,
+        'about_mae': round(error / len(pairs), 3) if pairs else 0.0
+    }
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark async_processor.py against local fakes")
+    parser.add_argument('--rows', type=int, default=100, help="Data rows per job (payloads are scaled up to this)")
+    parser.add_argument('--jobs', type=int, default=5, help="Calls per scenario")
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help="Comma-separated subset of " + ', '.join(SCENARIOS))
+    parser.add_argument('--payloads', default=os.path.join(REPO_DIR, 'uploads', 'processed_data_*.json'),
+                        help="Glob of recorded job payloads")
+    parser.add_argument('--latency', type=float, default=0.02, help="Base latency per fake request (seconds)")
+    parser.add_argument('--jitter', type=float, default=0.01, help="Uniform latency jitter (seconds)")
+    parser.add_argument('--token-delay', type=float, default=0.0, help="Delay between streamed Ollama chunks (seconds)")
+    parser.add_argument('--questions', type=int, default=1, help="Questions each job rates its rows on")
+    parser.add_argument('--question-mode', choices=('multi', 'separate'), default='multi',
+                        help="Several questions in one job (multi) or one job per question (separate)")
+    parser.add_argument('--ollama-url', help="Real Ollama /api/generate for the compress scenario's accuracy comparison")
+    parser.add_argument('--json', dest='json_path', help="Also write the results to this JSON file")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    latency = Latency(args.latency, args.jitter)
+    ollama = FakeOllama(latency, token_delay=args.token_delay).start()
+    sheets = FakeAppsScript(latency).start()
+    scheduler = FakeScheduler(latency).start()
+    workdir = tempfile.mkdtemp(prefix='processor-bench-')
+
+    # Point every outbound URL and on-disk path at the fakes / a scratch directory
+    # before the processor modules read their configuration
+    os.environ.update({
+        'OLLAMA_GENERATE_URL': ollama.url,
+        'SHEETS_WEB_APP_URL': sheets.url,
+        'SCHEDULER_UPLOAD_URL': scheduler.url,
+        'TASK_DIR': workdir,
+        'JOB_STORE_DB': os.path.join(workdir, 'jobs.sqlite3'),
+        'QUESTION_CACHE_DIR': os.path.join(workdir, 'question_cache'),
+        'QUESTION_CACHE_BYPASS': '1',
+        'RESULT_CACHE_DB': os.path.join(workdir, 'result_cache.sqlite3'),
+        'RESULT_CACHE_BYPASS': os.environ.get('RESULT_CACHE_BYPASS', '1'),
+        # Every scenario resubmits identical jobs on purpose
+        'JOB_DEDUP': os.environ.get('JOB_DEDUP', '0'),
+        # Measure the processor, not the outbound rate limits (override to benchmark them)
+        'SHEETS_RATE': os.environ.get('SHEETS_RATE', '10000'),
+        'SHEETS_BURST': os.environ.get('SHEETS_BURST', '10000'),
+        'SCHEDULER_RATE': os.environ.get('SCHEDULER_RATE', '10000'),
+        'SCHEDULER_BURST': os.environ.get('SCHEDULER_BURST', '10000'),
+        'METRICS_FILE': os.path.join(workdir, 'metrics.prom'),
+        'LOG_LEVEL': os.environ.get('LOG_LEVEL', 'WARNING')
+    })
+    import async_processor
+    from task_writer import TaskFileWriter
+
+    jobs = load_jobs(args.payloads, args.rows)
+    if not jobs:
+        print(f"No job payloads matched {args.payloads}", file=sys.stderr)
+        sys.exit(1)
+    job = jobs[0]
+    if args.questions > 1:
+        for source in jobs:
+            source['questions'] = [source['question']] + [f"{source['question']} (question {number})"
+                                                          for number in range(2, args.questions + 1)]
+    
+    def run_job(source):
+        if args.question_mode == 'separate' and 'questions' in source:
+            for question in source['questions']:
+                async_processor.process_job(dict(source, question=question, questions=[question]))
+        else:
+            async_processor.process_job(source)
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+
+    results = []
+    for name in scenarios:
+        if name == 'main':
+            fn = lambda i: run_job(jobs[i % len(jobs)])
+        elif name == 'ingest':
+            # Same jobs as 'main', but written to disk and read back the way PHP hands them over
+            input_paths = []
+            for index, source in enumerate(jobs):
+                input_path = os.path.join(workdir, f'job{index}.json')
+                with open(input_path, 'w') as f:
+                    json.dump(source, f)
+                input_paths.append(input_path)
+            fn = lambda i: async_processor.process_job(
+                async_processor.read_job_input(path=input_paths[i % len(input_paths)]))
+        elif name == 'load_data':
+            fn = lambda i: async_processor.load_data(job['sheet_id'], job['sheet_name'], 'bench', i + 2, 2)
+        elif name == 'convert':
+            fn = lambda i: async_processor.convert_question_to_binary_json(
+                job['question'], 'deepseek-r1:7b', job['sheet_id'], job['sheet_name'])
+        elif name == 'compress':
+            fn = lambda i: run_job(dict(jobs[i % len(jobs)], compress=True))
+        elif name == 'upload':
+            task_path = os.path.join(workdir, 'bench.task')
+            envelope = {'server': sheets.url, 'question': job['question'], 'sheet_id': job['sheet_id'],
+                        'sheet_name': job['sheet_name'], 'topic': 'bench'}
+            with TaskFileWriter(task_path, envelope) as writer:
+                writer.write_rows(async_processor.iter_task_rows(job, 3))
+            fn = lambda i: async_processor.upload_file(task_path)
+        else:
+            print(f"Unknown scenario: {name}", file=sys.stderr)
+            continue
+        results.append(run_scenario(name, args.jobs, fn, scheduler, ollama, sheets))
+
+    header = ('scenario', 'calls', 'jobs_per_s', 'p50_ms', 'p99_ms', 'peak_rss_mb', 'bytes_uploaded',
+              'new_tokens', 'tokens_per_cell')
+    print(f"rows/job={args.rows} latency={args.latency}s jitter={args.jitter}s "
+          f"ollama_requests={ollama.requests} sheets_requests={sheets.requests} sheets_cells={sheets.cells} "
+          f"prompt_tokens={ollama.prompt_tokens} new_prompt_tokens={ollama.new_prompt_tokens}")
+    print('  '.join(f"{column:>14}" for column in header))
+    for result in results:
+        print('  '.join(f"{result[column]:>14}" for column in header))
+
+    comparison = None
+    if 'compress' in scenarios:
+        comparison = compare_compression(async_processor, job, args.ollama_url or ollama.url,
+                                         int(os.environ.get('COMPRESS_TOKEN_BUDGET', 300)))
+        print("compression " + ' '.join(f"{key}={value}" for key, value in comparison.items()))
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump({'rows': args.rows, 'latency': args.latency, 'jitter': args.jitter,
+                       'timestamp': time.time(), 'results': results, 'compression': comparison}, f, indent=2)
+
+    for server in (ollama, sheets, scheduler):
+        server.stop()
+
+if __name__ == '__main__':
+    main()
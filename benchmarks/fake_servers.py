@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+fake_servers.py - Local stand-ins for Ollama, the Apps Script web app and the scheduler
+Each server runs on 127.0.0.1 on its own thread, replays recorded responses
+from benchmarks/recordings/ and adds configurable latency with jitter.
+"""
+
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+RECORDINGS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'recordings')
+
+class Latency:
+    """Sleep for base seconds plus uniform jitter in [-jitter, +jitter]"""
+
+    def __init__(self, base=0.0, jitter=0.0):
+        self.base = base
+        self.jitter = jitter
+
+    def sleep(self):
+        delay = self.base + random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+class FakeServer:
+    """Base class: start() binds a free port, stop() shuts down, counters are thread-safe"""
+
+    path = '/'
+
+    def __init__(self, latency=None):
+        self.latency = latency or Latency()
+        self.requests = 0
+        self.bytes_received = 0
+        self._lock = threading.Lock()
+        self._server = None
+
+    def handle(self, handler, body):
+        raise NotImplementedError
+
+    def count(self, body):
+        with self._lock:
+            self.requests += 1
+            self.bytes_received += len(body)
+
+    def start(self):
+        fake = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                body = self.rfile.read(length)
+                fake.count(body)
+                fake.handle(self, body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_port}{self.path}"
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+def _send_json(handler, body, status=200):
+    data = json.dumps(body).encode('utf-8')
+    handler.send_response(status)
+    handler.send_header('Content-Type', 'application/json')
+    handler.send_header('Content-Length', str(len(data)))
+    handler.end_headers()
+    handler.wfile.write(data)
+
+class FakeOllama(FakeServer):
+    """
+    /api/generate: streaming requests replay binary_question.ndjson one chunk at a time
+    (first_token latency, then token_delay per chunk); non-streaming requests
+    return row_score.json after the request latency, repeated once per call
+    for batched prompts and once per question for multi-question prompts
+
+    Prompt tokens (4 characters each) are counted twice: all of them, and
+    only those Ollama would evaluate with its per-slot KV cache, i.e. after
+    the longest prefix shared with the previous prompt of one of cache_slots
+    slots (OLLAMA_NUM_PARALLEL)
+    """
+
+    path = '/api/generate'
+
+    def __init__(self, latency=None, token_delay=0.0, stream_file='binary_question.ndjson', score_file='row_score.json',
+                 cache_slots=4):
+        super().__init__(latency)
+        self.token_delay = token_delay
+        self.prompt_tokens = 0
+        self.new_prompt_tokens = 0
+        self._slots = [''] * cache_slots
+        with open(os.path.join(RECORDINGS, stream_file), 'rb') as f:
+            self.stream_lines = [line for line in f.read().splitlines() if line]
+        with open(os.path.join(RECORDINGS, score_file), 'r') as f:
+            self.score_response = json.load(f)
+
+    def _count_prompt(self, prompt):
+        with self._lock:
+            slot, shared = max(((index, len(os.path.commonprefix([previous, prompt])))
+                                for index, previous in enumerate(self._slots)), key=lambda item: item[1])
+            self._slots[slot] = prompt
+            self.prompt_tokens += math.ceil(len(prompt) / 4)
+            self.new_prompt_tokens += math.ceil((len(prompt) - shared) / 4)
+
+    def handle(self, handler, body):
+        request = json.loads(body or b'{}')
+        prompt = request.get('prompt', '')
+        self._count_prompt(prompt)
+        self.latency.sleep()
+        if not request.get('stream', True):
+            questions = len(re.findall(r'^Question \d+: ', prompt, re.MULTILINE))
+            calls = len(re.findall(r'^Call \d+:$', prompt, re.MULTILINE))
+            if questions:
+                _send_json(handler, self._multi_response(questions))
+            elif calls:
+                _send_json(handler, self._batch_response(calls))
+            else:
+                _send_json(handler, self.score_response)
+            return
+
+        handler.send_response(200)
+        handler.send_header('Content-Type', 'application/x-ndjson')
+        handler.send_header('Transfer-Encoding', 'chunked')
+        handler.end_headers()
+        try:
+            for line in self.stream_lines:
+                if self.token_delay:
+                    time.sleep(self.token_delay)
+                chunk = line + b'\n'
+                handler.wfile.write(f"{len(chunk):x}\r\n".encode('ascii') + chunk + b"\r\n")
+            handler.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # Client closed the stream early once it had the full JSON answer
+            handler.close_connection = True
+
+    def _scores(self):
+        answer = self.score_response['response']
+        return json.loads(answer[answer.index('{'):answer.rindex('}')+1])
+
+    def _batch_response(self, calls):
+        entries = [dict(self._scores(), call=number) for number in range(1, calls + 1)]
+        return dict(self.score_response, response=json.dumps(entries))
+
+    def _multi_response(self, questions):
+        entries = {str(number): self._scores() for number in range(1, questions + 1)}
+        return dict(self.score_response, response=json.dumps(entries))
+
+class FakeAppsScript(FakeServer):
+    """Apps Script doPost: accepts single-cell, batched {cells: [...]} and {ranges: [{values: [[...]]}]} bodies"""
+
+    def __init__(self, latency=None):
+        super().__init__(latency)
+        self.cells = 0
+
+    def handle(self, handler, body):
+        request = json.loads(body or b'{}')
+        self.latency.sleep()
+        with self._lock:
+            self.cells += (len(request.get('cells', []))
+                           or sum(len(values) for block in request.get('ranges', []) for values in block['values'])
+                           or 1)
+        _send_json(handler, {'status': 'success', 'message': 'Sheet updated successfully'})
+
+class FakeScheduler(FakeServer):
+    """Scheduler /upload: accepts the multipart task file and reports it queued"""
+
+    path = '/upload'
+
+    def handle(self, handler, body):
+        self.latency.sleep()
+        _send_json(handler, {'status': 'queued'})
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+binary_question.py - Convert a rating question into binary decision JSON
+{"binary_topic", "positive_case", "negative_case", "unknown"} via a
+streaming Ollama call. Shared by async_processor.py and runQuestion.py so
+the prompt, the question cache and the early stream cut-off live in one place.
+"""
+
+import json
+
+import requests
+
+from debug_utils import debug_print, debug_error, debug_verbose
+from ollama_client import OllamaClient
+from question_cache import QuestionCache
+from stream_parser import ThinkStreamParser
+
+DEFAULT_MODEL = "deepseek-r1:7b"
+
+# Bump when the binary-decision prompt changes so cached answers are not reused
+PROMPT_VERSION = "binary-v1"
+
+OPTIONS = {
+    "temperature": 0.1,
+    "num_predict": 2048
+}
+
+def build_prompt(question):
+    return f"""Convert this question into a binary decision format with details. Output as JSON only.
+but be sure to think about it this question will be used to rate a text
+in the case case where someone asked if a dog was important you might have
+binary_topic about dog
+positive_case yes a dog was talked about in the text.
+negative_case
+
+Original question: "{question}"
+
+Format as valid JSON:
+{{
+    "binary_topic": "[extracted core concept]",
+    "positive_case": "[details supporting this]",
+    "negative_case": "[details opposing this]",
+    "unknown": "[details about what could determine this]"
+}}
+
+Output only valid JSON, no explanation."""
+
+# Fields process_job() and runQuestion.py read from every answer; "unknown" may be missing
+REQUIRED_FIELDS = ('binary_topic', 'positive_case', 'negative_case')
+
+def is_complete(result):
+    """True if a parsed answer has every required field as a string"""
+    return isinstance(result, dict) and all(isinstance(result.get(field), str) for field in REQUIRED_FIELDS)
+
+class BinaryAnswer:
+    """
+    Outcome of one conversion: the raw model text, the answer with <think>
+    blocks removed, the thinking blocks and the parsed JSON (None if the
+    answer did not parse)
+    """
+
+    def __init__(self, full_response, answer_text, thinking_blocks=(), result=None, cached=False):
+        self.full_response = full_response
+        self.answer_text = answer_text
+        self.thinking_blocks = list(thinking_blocks)
+        self.result = result
+        self.cached = cached
+
+def convert_question(question, model=DEFAULT_MODEL, client=None, cache=None, metrics=None, on_token=None):
+    """
+    Convert a question into binary decision format
+
+    Args:
+        question: The question to convert
+        model: The Ollama model to use
+        client: OllamaClient to send the request with (a new one if omitted)
+        cache: QuestionCache consulted first and filled with fresh answers
+        metrics: Optional Metrics for latency, time to first token, generation time and tokens/s
+        on_token: Optional callable receiving each streamed token
+    Returns:
+        BinaryAnswer, or None if Ollama could not be reached
+    """
+    cache = cache if cache is not None else QuestionCache()
+    cached = cache.get(question, model, PROMPT_VERSION, OPTIONS)
+    # Entries stored before answers were checked may be incomplete; ask the model again for those
+    if is_complete(cached):
+        debug_print(f"Question cache hit {cache.stats()}")
+        if metrics is not None:
+            metrics.incr('question_cache_hits')
+        answer_text = json.dumps(cached)
+        return BinaryAnswer(answer_text, answer_text, result=cached, cached=True)
+
+    client = client or OllamaClient()
+    parser = ThinkStreamParser()
+    try:
+        with client.stream(model, build_prompt(question), OPTIONS) as stream:
+            # Stop reading as soon as the JSON answer is complete
+            for token in stream:
+                if on_token is not None:
+                    on_token(token)
+                if parser.feed(token):
+                    debug_print("JSON answer complete, closing stream early")
+                    break
+        parser.finish()
+    except requests.exceptions.RequestException as e:
+        debug_error(f"Error connecting to Ollama: {e}")
+        return None
+    except json.JSONDecodeError as e:
+        debug_error(f"Error parsing Ollama stream: {e}")
+        return None
+
+    if metrics is not None:
+        metrics.observe('llm', stream.elapsed, model=model)
+        if stream.first_token is not None:
+            metrics.observe('llm_first_token', stream.first_token, model=model)
+            metrics.observe('llm_generation', stream.generation, model=model)
+        metrics.incr('llm_tokens', stream.tokens, model=model)
+        metrics.set('llm_tokens_per_second',
+                    round(stream.tokens / stream.generation, 2) if stream.generation else 0, model=model)
+    debug_print(f"Model answered in {stream.elapsed:.2f}s: first token {stream.first_token or 0:.2f}s, "
+                f"generation {stream.generation:.2f}s ({stream.tokens} tokens)")
+
+    for i, think in enumerate(parser.thinking_blocks, 1):
+        debug_verbose(f"--- Thinking Block {i} ---\n{think.strip()}")
+    debug_verbose(f"Final answer: {parser.answer_text}")
+
+    result = None
+    try:
+        result = json.loads(parser.json_text or parser.answer_text)
+        if is_complete(result):
+            cache.put(question, model, PROMPT_VERSION, result, OPTIONS)
+        else:
+            # Not cached, so the next run asks the model again
+            debug_error(f"Not caching answer without {', '.join(REQUIRED_FIELDS)}: {parser.answer_text}")
+    except json.JSONDecodeError as e:
+        debug_error(f"Error parsing JSON answer: {e}")
+        debug_error(f"Raw response: {parser.full_response}")
+    except OSError as e:
+        debug_error(f"Not caching answer: {str(e)}")
+
+    return BinaryAnswer(parser.full_response, parser.answer_text, parser.thinking_blocks, result)
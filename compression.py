@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+compression.py - Relevance-windowed transcript compression ahead of scoring
+Long transcripts are split into sentence windows (the transcripts carry no
+speaker labels, so line breaks are the only turn boundaries), ranked with
+BM25 against the binary_json topic and positive case, and cut down to a
+token budget by keeping the best windows in their original order. Each
+dropped stretch is replaced by ELISION so the model knows text is missing.
+Transcripts already within the budget are sent unchanged.
+
+Document frequencies come from every window of every row in the job,
+indexed in a first pass before any row is compressed.
+"""
+
+import math
+import re
+from collections import Counter
+
+from batching import estimate_tokens, CHARS_PER_TOKEN
+from prefilter import normalize_text
+
+ELISION = "[...]"
+
+_SENTENCE_RE = re.compile(r'(?<=[.!?])\s+|\n+')
+_WORD_RE = re.compile(r'[a-z0-9]+')
+_SUFFIXES = ('ing', 'es', 'ed', 's', 'e')
+# Rubric filler that would otherwise rank windows by how chatty they are (stemmed below)
+_FILLER_WORDS = (
+    'about', 'and', 'any', 'are', 'call', 'customer', 'discussed', 'for', 'from', 'has', 'have', 'into',
+    'mentioned', 'talked', 'text', 'that', 'the', 'their', 'them', 'there', 'they', 'this', 'was', 'were',
+    'what', 'when', 'which', 'with', 'would', 'you', 'your'
+)
+
+def stem(word):
+    """Crude suffix stripping so "price", "prices" and "pricing" share a term"""
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[:-len(suffix)]
+            break
+    if len(word) > 3 and word[-1] == word[-2]:
+        word = word[:-1]
+    return word
+
+_QUERY_STOPWORDS = frozenset(stem(word) for word in _FILLER_WORDS)
+
+def terms(text):
+    return [stem(word) for word in _WORD_RE.findall(normalize_text(text))]
+
+def split_windows(text, sentences=2):
+    """Consecutive windows of up to `sentences` sentences (or lines), in order"""
+    parts = [part.strip() for part in _SENTENCE_RE.split(str(text)) if part.strip()]
+    return [' '.join(parts[start:start + sentences]) for start in range(0, len(parts), sentences)]
+
+def query_terms(binary_jsons):
+    """BM25 query from the topic and positive case of one or more binary_json answers"""
+    text = ' '.join(str(binary_json.get(key) or '') for binary_json in binary_jsons
+                    for key in ('binary_topic', 'positive_case'))
+    return sorted({term for term in terms(text) if len(term) > 2 and term not in _QUERY_STOPWORDS})
+
+class BM25Index:
+    """Term -> document frequency table over windows, scoring windows against a query with Okapi BM25"""
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.df = Counter()
+        self.documents = 0
+        self.total_length = 0
+
+    def add(self, window_terms):
+        self.documents += 1
+        self.total_length += len(window_terms)
+        self.df.update(set(window_terms))
+
+    def idf(self, term):
+        n = self.df.get(term, 0)
+        return math.log(1 + (self.documents - n + 0.5) / (n + 0.5))
+
+    def score(self, query, window_terms):
+        if not window_terms or not self.documents:
+            return 0.0
+        counts = Counter(window_terms)
+        norm = self.k1 * (1 - self.b + self.b * len(window_terms) / (self.total_length / self.documents))
+        score = 0.0
+        for term in query:
+            tf = counts.get(term)
+            if tf:
+                score += self.idf(term) * tf * (self.k1 + 1) / (tf + norm)
+        return score
+
+class TranscriptCompressor:
+    """
+    Compress transcripts to at most budget tokens (estimate_tokens) of their most relevant windows.
+
+    index_text() every transcript of the job first, then compress() them;
+    tokens_in / tokens_out give the job's compression ratio.
+    """
+
+    def __init__(self, query, budget, sentences=2):
+        self.query = list(query)
+        self.budget = budget
+        self.sentences = sentences
+        self.index = BM25Index()
+        self.texts = 0
+        self.compressed = 0
+        self.tokens_in = 0
+        self.tokens_out = 0
+
+    @classmethod
+    def from_binary_json(cls, binary_jsons, budget, sentences=2):
+        return cls(query_terms(binary_jsons), budget, sentences)
+
+    @property
+    def ratio(self):
+        """Tokens sent over tokens in the original transcripts (1.0 before anything is compressed)"""
+        return self.tokens_out / self.tokens_in if self.tokens_in else 1.0
+
+    def index_text(self, text):
+        for window in split_windows(text, self.sentences):
+            self.index.add(terms(window))
+
+    def compress(self, text):
+        text = str(text)
+        tokens = estimate_tokens(text)
+        self.texts += 1
+        self.tokens_in += tokens
+        if tokens <= self.budget:
+            self.tokens_out += tokens
+            return text
+
+        windows = split_windows(text, self.sentences)
+        scores = [self.index.score(self.query, terms(window)) for window in windows]
+        # Best windows first; ties (and a query with no hits) keep the earliest windows
+        ranked = sorted(range(len(windows)), key=lambda index: (-scores[index], index))
+        elision_tokens = estimate_tokens(ELISION)
+        keep = set()
+        used = 0
+        for index in ranked:
+            cost = estimate_tokens(windows[index]) + elision_tokens
+            if used + cost <= self.budget:
+                keep.add(index)
+                used += cost
+        if not keep:
+            # Even the best window is over budget: keep as much of it as fits
+            best = ranked[0]
+            windows[best] = windows[best][:max(1, self.budget - elision_tokens) * CHARS_PER_TOKEN]
+            keep.add(best)
+
+        parts = []
+        for index, window in enumerate(windows):
+            if index in keep:
+                parts.append(window)
+            elif not parts or parts[-1] != ELISION:
+                parts.append(ELISION)
+        compressed = ' '.join(parts)
+        self.compressed += 1
+        self.tokens_out += estimate_tokens(compressed)
+        return compressed
+
+    def compress_rows(self, rows):
+        """Yield (compressed text, row, column) for (text, row, column) rows"""
+        for text, row, column in rows:
+            yield self.compress(text), row, column
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+debug_utils.py - Logging shared by the processor modules
+debug_print/debug_error are thin wrappers over the "processor" logger:
+INFO and below go to stdout, WARNING and above to stderr, so Docker picks
+both up. Records are buffered and written in batches instead of flushing
+stdout on every line.
+
+Environment:
+    LOG_LEVEL        DEBUG, INFO (default), WARNING, ERROR
+    LOG_FORMAT       text (default) or json (one JSON object per line)
+    LOG_MAX_CHARS    longer messages are truncated (default 2000, 0 = never)
+    LOG_BUFFER       records held before a write (default 50, 1 = unbuffered);
+                     WARNING and above always flush immediately
+    ECHO_TOKENS      echo streamed model tokens every N tokens (0/unset = off)
+"""
+
+import json
+import logging
+import logging.handlers
+import os
+import sys
+from datetime import datetime
+
+logger = logging.getLogger('processor')
+
+MAX_CHARS = int(os.environ.get('LOG_MAX_CHARS', 2000))
+
+class JsonLinesFormatter(logging.Formatter):
+    """One JSON object per record; extra fields passed via extra={'fields': {...}} are merged in"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'msg': record.getMessage()
+        }
+        entry.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class _TextFormatter(logging.Formatter):
+    """Plain '[timestamp] message' lines, with any extra fields appended as compact JSON"""
+
+    def format(self, record):
+        text = super().format(record)
+        fields = getattr(record, 'fields', None)
+        if fields:
+            text += ' ' + json.dumps(fields, default=str, separators=(',', ':'))
+        return text
+
+class _LevelRangeFilter(logging.Filter):
+    """Filter (not setLevel) so it still applies when a MemoryHandler hands records over"""
+
+    def __init__(self, low, high):
+        super().__init__()
+        self.low = low
+        self.high = high
+
+    def filter(self, record):
+        return self.low <= record.levelno < self.high
+
+def configure_logging(level=None, fmt=None, buffer_records=None):
+    """(Re)configure the processor logger; called once on import with the environment defaults"""
+    level = level or os.environ.get('LOG_LEVEL', 'INFO')
+    fmt = fmt or os.environ.get('LOG_FORMAT', 'text')
+    if buffer_records is None:
+        buffer_records = int(os.environ.get('LOG_BUFFER', 50))
+
+    if fmt == 'json':
+        formatter = JsonLinesFormatter()
+    else:
+        formatter = _TextFormatter('[%(asctime)s] %(message)s', '%Y-%m-%d %H:%M:%S')
+
+    stdout_handler = logging.StreamHandler(sys.stdout)
+    stdout_handler.addFilter(_LevelRangeFilter(logging.NOTSET, logging.WARNING))
+    stderr_handler = logging.StreamHandler(sys.stderr)
+    stderr_handler.addFilter(_LevelRangeFilter(logging.WARNING, logging.CRITICAL + 1))
+    if fmt != 'json':
+        stderr_handler.setFormatter(_TextFormatter('[%(levelname)s %(asctime)s] %(message)s', '%Y-%m-%d %H:%M:%S'))
+    else:
+        stderr_handler.setFormatter(formatter)
+    stdout_handler.setFormatter(formatter)
+
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
+    for target in (stdout_handler, stderr_handler):
+        if buffer_records > 1:
+            target = logging.handlers.MemoryHandler(buffer_records, flushLevel=logging.WARNING, target=target)
+        logger.addHandler(target)
+    logger.setLevel(level.upper())
+    logger.propagate = False
+
+def truncate(msg, limit=None):
+    """Cut very long messages (e.g. whole transcripts or payloads) down to limit characters"""
+    limit = MAX_CHARS if limit is None else limit
+    msg = str(msg)
+    if limit and len(msg) > limit:
+        return f"{msg[:limit]}... [truncated {len(msg) - limit} chars]"
+    return msg
+
+def flush_logs():
+    """Write out any buffered records (end of a job, before a long wait)"""
+    for handler in logger.handlers:
+        handler.flush()
+
+def debug_print(msg, **fields):
+    """Log an informational message (stdout)"""
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(truncate(msg), extra={'fields': fields})
+
+def debug_error(msg, **fields):
+    """Log an error message (stderr, flushed immediately)"""
+    logger.error(truncate(msg), extra={'fields': fields})
+
+def debug_verbose(msg, **fields):
+    """Log a DEBUG-level message, skipped entirely unless LOG_LEVEL=DEBUG"""
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(truncate(msg), extra={'fields': fields})
+
+class TokenEcho:
+    """
+    Sampled echo of streamed model tokens
+
+    Every `every` tokens the text received since the last echo is logged as
+    one record, instead of one stdout write per token.
+    """
+
+    def __init__(self, every=None):
+        if every is None:
+            every = int(os.environ.get('ECHO_TOKENS', 0) or 0)
+        self.every = every
+        self.tokens = 0
+        self._pending = []
+
+    def __call__(self, token):
+        self.tokens += 1
+        if not self.every:
+            return
+        self._pending.append(token)
+        if self.tokens % self.every == 0:
+            self.flush()
+
+    def flush(self):
+        if self._pending:
+            logger.info(''.join(self._pending), extra={'fields': {'tokens': self.tokens}})
+            self._pending = []
+
+configure_logging()
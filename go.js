@@ -431,6 +431,12 @@ function sendQuestionToServer(question, rowsData, selectedRows, sheet, selectedC
     if (responseCode == 200) {
       try {
         var jsonResponse = JSON.parse(responseBody);
+        if (jsonResponse.queued === false) {
+          // The worker daemon rejected the job, so no scores will be written
+          ui.alert('Server busy', 'The question could not be queued (' + (jsonResponse.reason || 'rejected') +
+                   '). Please try again in a minute.', ui.ButtonSet.OK);
+          return;
+        }
         ui.alert('Success!', 'Question submitted. Response received.', ui.ButtonSet.OK);
         // Write response to column if available
         writeAnswerToColumn(sheet, selectedRows, jsonResponse.result || jsonResponse.response, 'AI Response ' + responseBody);
@@ -491,6 +497,17 @@ function doPost(e) {
     
     var sheetId = data.sheet_id;
     var sheetName = data.sheet_name || 'Sheet1';
+
+    // Batched writes from sheet_writer.py: { sheet_id, sheet_name, cells: [{row, column, value}] }
+    if (data.cells) {
+      return writeCells(sheetId, sheetName, data.cells);
+    }
+
+    // Result blocks from sheet_writer.py write_ranges: { sheet_id, sheet_name, ranges: [{row, column, values: [[...]]}] }
+    if (data.ranges) {
+      return writeRanges(sheetId, sheetName, data.ranges);
+    }
+
     var row = parseInt(data.row);
     var value = data.value;
     
@@ -547,6 +564,58 @@ function doPost(e) {
   }
 }
 
+/**
+ * Write several cells of one sheet in a single request
+ */
+function writeCells(sheetId, sheetName, cells) {
+  var spreadsheet = SpreadsheetApp.openById(sheetId);
+  var sheet = spreadsheet.getSheetByName(sheetName);
+
+  if (!sheet) {
+    return errorResponse('Sheet not found');
+  }
+
+  for (var i = 0; i < cells.length; i++) {
+    sheet.getRange(parseInt(cells[i].row), parseInt(cells[i].column)).setValue(cells[i].value);
+  }
+
+  return successResponse({
+    'sheet': sheetName,
+    'cells': cells.length
+  });
+}
+
+/**
+ * Write a block of rows with one setValues call
+ */
+function writeRanges(sheetId, sheetName, ranges) {
+  var spreadsheet = SpreadsheetApp.openById(sheetId);
+  var sheet = spreadsheet.getSheetByName(sheetName);
+
+  if (!sheet) {
+    return errorResponse('Sheet not found');
+  }
+
+  var rows = 0;
+  var cells = 0;
+  for (var i = 0; i < ranges.length; i++) {
+    var values = ranges[i].values;
+    if (!values || values.length === 0) {
+      continue;
+    }
+    sheet.getRange(parseInt(ranges[i].row), parseInt(ranges[i].column), values.length, values[0].length).setValues(values);
+    rows += values.length;
+    cells += values.length * values[0].length;
+  }
+
+  return successResponse({
+    'sheet': sheetName,
+    'ranges': ranges.length,
+    'rows': rows,
+    'cells': cells
+  });
+}
+
 /**
  * Success response helper
  */
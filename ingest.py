@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+ingest.py - Streaming ingestion of job payloads
+A job arrives as either
+    one JSON object {"question": ..., "rows": [...], "allRowsData": [...], ...}
+or NDJSON: a header object without allRowsData followed by one row object per line.
+The payload is parsed incrementally from a file or stream; each allRowsData
+row is written to an on-disk RowSpool as soon as it is parsed, so memory
+stays flat however many rows the sheet selection has.
+"""
+
+import io
+import json
+import os
+import tempfile
+
+SPOOL_DIR = os.environ.get('SPOOL_DIR') or None
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\n\r'
+
+class RowSpool:
+    """
+    Append-only on-disk list of rows (one JSON line each) that can be iterated many times.
+
+    Supports len(), iteration and spool[0] (cached); other indexes scan the file.
+    """
+
+    def __init__(self, directory=SPOOL_DIR):
+        handle, self.path = tempfile.mkstemp(prefix='rows-', suffix='.ndjson', dir=directory)
+        self._file = os.fdopen(handle, 'w', encoding='utf-8')
+        self._count = 0
+        self._first = None
+
+    def append(self, row):
+        if self._count == 0:
+            self._first = row
+        self._file.write(json.dumps(row, separators=(',', ':')))
+        self._file.write('\n')
+        self._count += 1
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        if not self._file.closed:
+            self._file.flush()
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                yield json.loads(line)
+
+    def __getitem__(self, index):
+        if index == 0 and self._first is not None:
+            return self._first
+        if index < 0:
+            index += self._count
+        for position, row in enumerate(self):
+            if position == index:
+                return row
+        raise IndexError(index)
+
+    def close(self):
+        """Delete the spool file"""
+        if not self._file.closed:
+            self._file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+class _StreamReader:
+    """Incremental JSON tokenizer over a text stream with a sliding buffer"""
+
+    def __init__(self, stream, chunk_size=65536):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self.bytes_read = 0
+
+    def _fill(self, at_least=1):
+        if self.pos > len(self.buffer) // 2:
+            self.buffer = self.buffer[self.pos:]
+            self.pos = 0
+        chunk = self.stream.read(max(self.chunk_size, at_least))
+        if not chunk:
+            self.eof = True
+            return False
+        self.bytes_read += len(chunk)
+        self.buffer += chunk
+        return True
+
+    def peek(self):
+        """Next non-whitespace character ('' at end of input)"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected {char!r} at offset {self.bytes_read - len(self.buffer) + self.pos}, found {found!r}")
+        self.pos += 1
+
+    def value(self):
+        """Decode the next complete JSON value, reading more input until it fits in the buffer"""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+                # A number at the very end of the buffer may continue in the next chunk
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            # Grow geometrically so one large value costs linear time overall
+            if not self._fill(len(self.buffer) - self.pos):
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+                self.pos = end
+                return value
+
+def read_job(stream, spool_dir=SPOOL_DIR):
+    """
+    Parse one job from a text or binary stream
+
+    Returns:
+        dict: The job metadata with 'allRowsData' replaced by a RowSpool
+              (the caller closes it), or None if the stream was empty
+
+    Raises:
+        ValueError: If the payload is not valid JSON
+    """
+    if isinstance(stream, (io.RawIOBase, io.BufferedIOBase)) or 'b' in getattr(stream, 'mode', ''):
+        stream = io.TextIOWrapper(stream, encoding='utf-8')
+    reader = _StreamReader(stream)
+    if reader.peek() == '':
+        return None
+
+    data = {}
+    spool = RowSpool(spool_dir)
+    try:
+        reader.expect('{')
+        if reader.peek() == '}':
+            reader.pos += 1
+        else:
+            while True:
+                key = reader.value()
+                reader.expect(':')
+                if key == 'allRowsData' and reader.peek() == '[':
+                    reader.pos += 1
+                    if reader.peek() == ']':
+                        reader.pos += 1
+                    else:
+                        while True:
+                            spool.append(reader.value())
+                            if reader.peek() == ',':
+                                reader.pos += 1
+                                continue
+                            reader.expect(']')
+                            break
+                else:
+                    data[key] = reader.value()
+                if reader.peek() == ',':
+                    reader.pos += 1
+                    continue
+                reader.expect('}')
+                break
+
+        # NDJSON: anything after the header object is one row per line
+        while reader.peek() != '':
+            spool.append(reader.value())
+    except (json.JSONDecodeError, ValueError):
+        spool.close()
+        raise
+
+    data['allRowsData'] = spool
+    data['_input_bytes'] = reader.bytes_read
+    return data
+
+def read_job_file(path, spool_dir=SPOOL_DIR):
+    """read_job() for a file path"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return read_job(f, spool_dir)
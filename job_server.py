@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+job_server.py - Persistent worker daemon for async_processor.py
+Listens on a local Unix socket, queues jobs from PHP in a bounded queue and
+runs them on a fixed pool of worker threads
+
+Protocol: the client writes one JSON (or NDJSON, see ingest.py) job and shuts down its write side,
+then reads back one JSON reply:
+    {"status": "queued", "queue_depth": N}   job accepted
+    {"status": "busy"}                       queue full, job rejected
+    {"status": "error", "message": "..."}    payload was not valid JSON
+"""
+
+import json
+import os
+import queue
+import signal
+import socketserver
+import threading
+import traceback
+
+from debug_utils import debug_print, debug_error
+
+class _JobHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            data = self.server.read_job(self.rfile)
+        except (ValueError, UnicodeDecodeError) as e:
+            debug_error(f"Rejected job with invalid JSON: {str(e)}")
+            self._reply({'status': 'error', 'message': 'Invalid JSON'})
+            return
+        if not isinstance(data, dict):
+            debug_error("Rejected empty or non-object job")
+            self._reply({'status': 'error', 'message': 'Invalid JSON'})
+            return
+
+        try:
+            self.server.jobs.put_nowait(data)
+        except queue.Full:
+            debug_error("Job queue full, rejecting job")
+            _discard(data)
+            self._reply({'status': 'busy'})
+            return
+
+        debug_print(f"Queued job, queue depth {self.server.jobs.qsize()}")
+        self._reply({'status': 'queued', 'queue_depth': self.server.jobs.qsize()})
+
+    def _reply(self, body):
+        self.wfile.write(json.dumps(body).encode('utf-8'))
+
+def _read_json(stream):
+    return json.loads(stream.read())
+
+def _discard(data):
+    """Release anything a rejected job holds (e.g. a spooled allRowsData)"""
+    rows = data.get('allRowsData')
+    if hasattr(rows, 'close'):
+        rows.close()
+
+class JobServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, jobs, read_job=_read_json):
+        self.jobs = jobs
+        self.read_job = read_job
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        super().__init__(socket_path, _JobHandler)
+        # Apache (www-data) must be able to connect when the daemon runs as root
+        os.chmod(socket_path, 0o666)
+
+def _worker(number, jobs, process_job):
+    while True:
+        data = jobs.get()
+        if data is None:
+            jobs.task_done()
+            return
+        try:
+            debug_print(f"=== WORKER {number} STARTING JOB ===")
+            process_job(data)
+        except Exception as e:
+            debug_error(f"Worker {number} failed job: {str(e)}")
+            debug_error(f"Traceback: {traceback.format_exc()}")
+        finally:
+            debug_print(f"=== WORKER {number} FINISHED JOB ===\n")
+            jobs.task_done()
+
+def serve(process_job, socket_path, workers=2, queue_size=20, read_job=None):
+    """
+    Run the daemon until SIGTERM/SIGINT
+
+    Args:
+        process_job: Callable taking one parsed job dict
+        socket_path: Unix socket to listen on
+        workers: Number of jobs processed concurrently
+        queue_size: Jobs allowed to wait; further jobs are answered "busy"
+        read_job: Callable parsing one job from the binary socket stream
+                  (default: read it all and json.loads)
+    """
+    jobs = queue.Queue(maxsize=queue_size)
+    threads = []
+    for number in range(1, workers + 1):
+        thread = threading.Thread(target=_worker, args=(number, jobs, process_job), daemon=True)
+        thread.start()
+        threads.append(thread)
+
+    server = JobServer(socket_path, jobs, read_job or _read_json)
+
+    def _stop(signum, frame):
+        # shutdown() blocks until serve_forever() returns, so call it off the main thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    debug_print(f"Job server listening on {socket_path} with {workers} worker(s), queue size {queue_size}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        # Let queued jobs finish before exiting
+        for _ in threads:
+            jobs.put(None)
+        for thread in threads:
+            thread.join()
+        debug_print("Job server stopped")
@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+job_store.py - Indexed SQLite store for processed jobs
+Replaces the per-run processed_data_<timestamp>.json dumps and
+processing_log.txt: one row per job holding metadata, the zlib-compressed
+input payload, the LLM output and the task file reference, indexed by
+job id, sheet_id and question hash, with retention and compaction.
+The admissions table deduplicates repeated submissions of the same job
+across processes (see JobStore.admit)
+
+Usage:
+    python3 job_store.py import [uploads_dir]   load legacy processed_data_*.json dumps
+    python3 job_store.py compact [days]         apply retention and reclaim space
+    python3 job_store.py get <job_id>           print one job as JSON
+"""
+
+import glob
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+import zlib
+
+from debug_utils import debug_print, debug_error
+from question_cache import normalize_question
+
+DEFAULT_DB = os.environ.get(
+    'JOB_STORE_DB',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads', 'jobs.sqlite3')
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    created REAL NOT NULL,
+    sheet_id TEXT,
+    sheet_name TEXT,
+    question TEXT,
+    question_hash TEXT,
+    row_count INTEGER,
+    payload BLOB,
+    llm_output TEXT,
+    task_file TEXT,
+    status TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_sheet_id ON jobs (sheet_id, created);
+CREATE INDEX IF NOT EXISTS jobs_question_hash ON jobs (question_hash, created);
+CREATE INDEX IF NOT EXISTS jobs_created ON jobs (created);
+CREATE TABLE IF NOT EXISTS admissions (
+    fingerprint TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    state TEXT NOT NULL,
+    started REAL NOT NULL,
+    finished REAL,
+    pid INTEGER
+);
+"""
+
+ADMITTED = 'admitted'
+COALESCED = 'coalesced'
+RECENT = 'recent'
+
+
+_UPDATABLE = ('llm_output', 'task_file', 'status')
+
+def _pid_alive(pid):
+    """False only if no process with this pid exists (a process of another user counts as alive)"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def question_hash(question):
+    return hashlib.sha256(normalize_question(question).encode('utf-8')).hexdigest()
+
+def job_fingerprint(data):
+    """
+    Identity of a submission: the same sheet, rows, question and columns
+    hash the same however often the sidebar button is clicked
+    """
+    identity = {
+        'sheet_id': data.get('sheet_id', ''),
+        'sheet_name': data.get('sheet_name', ''),
+        'rows': sorted(data.get('rows') or []),
+        'question': normalize_question(data.get('question', '')),
+        'selected_columns': data.get('selected_columns') or []
+    }
+    if data.get('questions'):
+        identity['questions'] = [normalize_question(question) for question in data['questions']]
+    material = json.dumps(identity, sort_keys=True)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+def _compress_payload(output_data):
+    """
+    zlib-compressed JSON of output_data
+    A 'data' value that is not a list (e.g. an ingest.RowSpool) is streamed
+    row by row into the compressor instead of being built as one string
+    """
+    rows = output_data.get('data')
+    if rows is None or isinstance(rows, list):
+        return zlib.compress(json.dumps(output_data, separators=(',', ':')).encode('utf-8'))
+
+    head = {key: value for key, value in output_data.items() if key != 'data'}
+    compressor = zlib.compressobj()
+    parts = [compressor.compress(json.dumps(head, separators=(',', ':'))[:-1].encode('utf-8'))]
+    parts.append(compressor.compress((',' if head else '').encode('utf-8') + b'"data":['))
+    for index, row in enumerate(rows):
+        prefix = ',' if index else ''
+        parts.append(compressor.compress((prefix + json.dumps(row, separators=(',', ':'))).encode('utf-8')))
+    parts.append(compressor.compress(b']}'))
+    parts.append(compressor.flush())
+    return b''.join(parts)
+
+class JobStore:
+    """
+    Thread-safe handle on the job database (WAL mode, so several processes can share it).
+
+    The input payload is stored as compact zlib-compressed JSON, which is
+    much smaller than the pretty-printed per-job files it replaces.
+    """
+
+    def __init__(self, path=DEFAULT_DB, retention_days=30):
+        self.path = path
+        self.retention_days = retention_days
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            # auto_vacuum only takes effect before the file is initialized, which switching to WAL does
+            self._conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+            columns = {row['name'] for row in self._conn.execute("PRAGMA table_info(admissions)")}
+            if 'pid' not in columns:
+                self._conn.execute("ALTER TABLE admissions ADD COLUMN pid INTEGER")
+            auto_vacuum = self._conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+        if auto_vacuum != 2:
+            # A database created without it needs one full VACUUM to switch to incremental mode
+            debug_print(f"Converting job store {path} to incremental auto_vacuum")
+            with self._lock:
+                self._conn.execute("VACUUM")
+        self._compactor = None
+
+    def save_job(self, output_data, job_id=None, created=None):
+        """
+        Store a new job built from the processor's output_data dict
+
+        Returns:
+            str: The job id
+        """
+        job_id = job_id or str(uuid.uuid4())
+        payload = _compress_payload(output_data)
+        question = output_data.get('question', '')
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO jobs (job_id, created, sheet_id, sheet_name, question, question_hash, row_count, payload, status) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, created or time.time(), output_data.get('sheet_id'), output_data.get('sheet_name'),
+                 question, question_hash(question), output_data.get('row_count'), payload, 'received')
+            )
+        return job_id
+
+    def update_job(self, job_id, **fields):
+        """Set llm_output, task_file and/or status on an existing job"""
+        unknown = set(fields) - set(_UPDATABLE)
+        if unknown:
+            raise ValueError(f"Cannot update job fields: {sorted(unknown)}")
+        if not fields:
+            return
+        assignments = ', '.join(f"{name} = ?" for name in fields)
+        with self._lock, self._conn:
+            self._conn.execute(f"UPDATE jobs SET {assignments} WHERE job_id = ?", (*fields.values(), job_id))
+
+    def get_job(self, job_id):
+        """Return one job as a dict (payload decoded), or None"""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return self._decode(row) if row else None
+
+    def find_jobs(self, sheet_id=None, question=None, limit=50, with_payload=False):
+        """Most recent jobs for a sheet and/or question, newest first"""
+        clauses = []
+        params = []
+        if sheet_id is not None:
+            clauses.append("sheet_id = ?")
+            params.append(sheet_id)
+        if question is not None:
+            clauses.append("question_hash = ?")
+            params.append(question_hash(question))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT * FROM jobs {where} ORDER BY created DESC LIMIT ?", (*params, limit)
+            ).fetchall()
+        return [self._decode(row, with_payload) for row in rows]
+
+    def _decode(self, row, with_payload=True):
+        job = dict(row)
+        payload = job.pop('payload')
+        if with_payload and payload is not None:
+            job['payload'] = json.loads(zlib.decompress(payload))
+        return job
+
+    def admit(self, fingerprint, window=300, stale_after=3600):
+        """
+        Decide whether a job with this fingerprint should run
+
+        Args:
+            fingerprint: job_fingerprint() of the submission
+            window: Seconds after an identical job finished during which repeats are skipped
+            stale_after: Seconds after which a still-running entry is assumed to be a crashed run;
+                         one whose process has exited is treated as crashed straight away
+        Returns:
+            tuple: (ADMITTED, owner token to pass to release()),
+                   (COALESCED, None) if an identical job is in flight, or
+                   (RECENT, None) if one finished within the window
+        """
+        now = time.time()
+        owner = str(uuid.uuid4())
+        with self._lock, self._conn:
+            # IMMEDIATE takes the write lock up front so two processes cannot both admit
+            self._conn.execute("BEGIN IMMEDIATE")
+            row = self._conn.execute(
+                "SELECT state, started, finished, pid FROM admissions WHERE fingerprint = ?", (fingerprint,)
+            ).fetchone()
+            if row is not None:
+                if (row['state'] == 'running' and now - row['started'] < stale_after
+                        and (row['pid'] is None or _pid_alive(row['pid']))):
+                    return COALESCED, None
+                if row['state'] == 'done' and now - row['finished'] < window:
+                    return RECENT, None
+            self._conn.execute(
+                "INSERT OR REPLACE INTO admissions (fingerprint, owner, state, started, finished, pid) "
+                "VALUES (?, ?, 'running', ?, NULL, ?)",
+                (fingerprint, owner, now, os.getpid())
+            )
+        return ADMITTED, owner
+
+    def release(self, fingerprint, owner, completed=True):
+        """
+        Mark an admitted job finished; a failed job (completed=False) is forgotten
+        so resubmitting it runs again
+        """
+        with self._lock, self._conn:
+            if completed:
+                self._conn.execute(
+                    "UPDATE admissions SET state = 'done', finished = ? WHERE fingerprint = ? AND owner = ?",
+                    (time.time(), fingerprint, owner)
+                )
+            else:
+                self._conn.execute("DELETE FROM admissions WHERE fingerprint = ? AND owner = ?", (fingerprint, owner))
+
+    def compact(self, retention_days=None):
+        """
+        Delete jobs older than the retention window and hand freed pages back to the filesystem
+
+        Returns:
+            int: Number of jobs deleted
+        """
+        days = self.retention_days if retention_days is None else retention_days
+        cutoff = time.time() - days * 24 * 3600
+        with self._lock, self._conn:
+            deleted = self._conn.execute("DELETE FROM jobs WHERE created < ?", (cutoff,)).rowcount
+            self._conn.execute("DELETE FROM admissions WHERE started < ?", (time.time() - 24 * 3600,))
+        with self._lock:
+            self._conn.execute("PRAGMA incremental_vacuum")
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        if deleted:
+            debug_print(f"Job store compaction removed {deleted} job(s) older than {days} day(s)")
+        return deleted
+
+    def start_compaction(self, interval=3600):
+        """Run compact() every interval seconds on a daemon thread"""
+        if self._compactor is not None:
+            return
+
+        def _loop():
+            while True:
+                try:
+                    self.compact()
+                except Exception as e:
+                    debug_error(f"Job store compaction failed: {str(e)}")
+                time.sleep(interval)
+
+        self._compactor = threading.Thread(target=_loop, daemon=True)
+        self._compactor.start()
+
+    def import_legacy(self, directory):
+        """
+        Load processed_data_*.json dumps written by earlier versions
+
+        Returns:
+            int: Number of files imported
+        """
+        imported = 0
+        for path in sorted(glob.glob(os.path.join(directory, 'processed_data_*.json'))):
+            try:
+                with open(path, 'r') as f:
+                    output_data = json.load(f)
+            except (OSError, ValueError) as e:
+                debug_error(f"Skipping {path}: {str(e)}")
+                continue
+            job_id = os.path.splitext(os.path.basename(path))[0]
+            if self.get_job(job_id) is not None:
+                continue
+            self.save_job(output_data, job_id=job_id, created=os.path.getmtime(path))
+            self.update_job(job_id, status='imported')
+            imported += 1
+        return imported
+
+    def close(self):
+        self._conn.close()
+
+def main():
+    store = JobStore()
+    command = sys.argv[1] if len(sys.argv) > 1 else ''
+    if command == 'import':
+        directory = sys.argv[2] if len(sys.argv) > 2 else os.path.dirname(store.path)
+        print(f"Imported {store.import_legacy(directory)} job(s)")
+    elif command == 'compact':
+        days = float(sys.argv[2]) if len(sys.argv) > 2 else None
+        print(f"Removed {store.compact(days)} job(s)")
+    elif command == 'get' and len(sys.argv) > 2:
+        print(json.dumps(store.get_job(sys.argv[2]), indent=2))
+    else:
+        print(__doc__)
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
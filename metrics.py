@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+metrics.py - Counters and timers for the processor
+Each job collects its own Metrics (stdin parse, LLM latency, tokens/s,
+Sheets round trips, upload bytes/time, stage timings); they are logged as
+one JSON line per job and merged into the process-wide METRICS, which is
+written to METRICS_FILE in Prometheus text format and optionally served
+over HTTP (/metrics, /metrics.json) in --serve mode.
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from debug_utils import debug_print, debug_error
+
+METRICS_FILE = os.environ.get(
+    'METRICS_FILE',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads', 'metrics.prom')
+)
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+def _label_text(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in labels) + '}'
+
+class Metrics:
+    """Thread-safe counters, gauges and timers (count/sum/max), optionally labelled"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.timers = {}
+
+    def incr(self, name, value=1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self.gauges[_key(name, labels)] = value
+
+    def observe(self, name, seconds, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            count, total, largest = self.timers.get(key, (0, 0.0, 0.0))
+            self.timers[key] = (count + 1, total + seconds, max(largest, seconds))
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def merge(self, other):
+        """Add another Metrics (e.g. one job's) into this one"""
+        with other._lock:
+            counters = dict(other.counters)
+            gauges = dict(other.gauges)
+            timers = dict(other.timers)
+        with self._lock:
+            for key, value in counters.items():
+                self.counters[key] = self.counters.get(key, 0) + value
+            self.gauges.update(gauges)
+            for key, (count, total, largest) in timers.items():
+                old_count, old_total, old_largest = self.timers.get(key, (0, 0.0, 0.0))
+                self.timers[key] = (old_count + count, old_total + total, max(old_largest, largest))
+
+    def snapshot(self):
+        """JSON-friendly view: {"name{label=...}": value or {count, sum, max}}"""
+        with self._lock:
+            out = {}
+            for (name, labels), value in list(self.counters.items()) + list(self.gauges.items()):
+                out[name + _label_text(labels)] = value
+            for (name, labels), (count, total, largest) in self.timers.items():
+                out[name + _label_text(labels)] = {'count': count, 'sum': round(total, 6), 'max': round(largest, 6)}
+        return out
+
+    def to_prometheus(self, prefix='processor_'):
+        lines = []
+        with self._lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                lines.append(f"{prefix}{name}_total{_label_text(labels)} {value}")
+            for (name, labels), value in sorted(self.gauges.items()):
+                lines.append(f"{prefix}{name}{_label_text(labels)} {value}")
+            for (name, labels), (count, total, largest) in sorted(self.timers.items()):
+                lines.append(f"{prefix}{name}_seconds_count{_label_text(labels)} {count}")
+                lines.append(f"{prefix}{name}_seconds_sum{_label_text(labels)} {total:.6f}")
+                lines.append(f"{prefix}{name}_seconds_max{_label_text(labels)} {largest:.6f}")
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path=METRICS_FILE):
+        """Atomically write the Prometheus text file (for node_exporter's textfile collector or a scrape)"""
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                f.write(self.to_prometheus())
+            # mkstemp creates the file owner-only; the scraper may run as another user
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            debug_error(f"Failed to write metrics file: {str(e)}")
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+METRICS = Metrics()
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == '/metrics.json':
+            body = json.dumps(METRICS.snapshot()).encode('utf-8')
+            content_type = 'application/json'
+        elif self.path == '/metrics':
+            body = METRICS.to_prometheus().encode('utf-8')
+            content_type = 'text/plain; version=0.0.4'
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def serve_metrics(port, host='127.0.0.1'):
+    """Serve METRICS on a daemon thread"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    debug_print(f"Metrics available on http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+near_dup.py - Near-duplicate transcript clustering (MinHash + LSH banding)
+Call transcripts that differ by a few words ("Thank you for calling Shred
+Nations... how many boxes... zip code") are grouped so only one
+representative per cluster is scored; its scores are fanned out to the
+other rows.
+
+Signatures use one-permutation MinHash: every word shingle is hashed once
+and the minimum is kept per bin (empty bins are filled from their right
+neighbour), so a signature costs O(shingles) instead of O(shingles x
+permutations). LSH banding finds candidate representatives without
+comparing every pair, and a row joins a cluster only if its estimated
+Jaccard similarity to the representative reaches the threshold.
+"""
+
+import re
+from array import array
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+def shingle_hashes(text, size=3):
+    """
+    32-bit hashes of the size-word shingles of a text (whole text if it is shorter)
+    Built-in tuple hashing is salted per process, so signatures are only
+    comparable within one process and must not be persisted
+    """
+    words = _WORD_RE.findall(str(text).lower().replace("'", ''))
+    if not words:
+        return set()
+    if len(words) < size:
+        return {hash(tuple(words)) & 0xFFFFFFFF}
+    return {hash(shingle) & 0xFFFFFFFF for shingle in zip(*(words[i:] for i in range(size)))}
+
+def lsh_bands(num_perm, threshold):
+    """
+    (bands, rows per band) whose S-curve midpoint (1/bands)^(1/rows) is as
+    close to threshold as possible without going above it, favouring recall;
+    candidates are verified against the threshold afterwards anyway
+    """
+    best = (num_perm, 1)
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        if (1.0 / bands) ** (1.0 / rows) <= threshold:
+            best = (bands, rows)
+    return best
+
+class MinHasher:
+    """One-permutation MinHash signatures with num_perm bins (a power of two)"""
+
+    def __init__(self, num_perm=64, shingle_size=3):
+        if num_perm & (num_perm - 1):
+            raise ValueError("num_perm must be a power of two")
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self._bin_shift = 32 - (num_perm.bit_length() - 1)
+
+    def signature(self, text):
+        """
+        Returns:
+            array: num_perm unsigned ints, or None for a text with no words
+        """
+        hashes = shingle_hashes(text, self.shingle_size)
+        if not hashes:
+            return None
+        empty = 0xFFFFFFFF
+        shift = self._bin_shift
+        mask = (1 << shift) - 1
+        # Spread the hash bits (Knuth multiplicative hash); the high bits pick the bin.
+        # Walking the values in descending order leaves each bin holding its minimum
+        spread = sorted(((value * 2654435761) & 0xFFFFFFFF for value in hashes), reverse=True)
+        minimums = {value >> shift: value & mask for value in spread}
+        bins = [minimums.get(index, empty) for index in range(self.num_perm)]
+        # Rotation densification: an empty bin borrows the next filled bin's value, offset by the distance
+        for index in range(self.num_perm):
+            if bins[index] != empty:
+                continue
+            for distance in range(1, self.num_perm):
+                value = bins[(index + distance) % self.num_perm]
+                if value != empty and value < (1 << shift):
+                    bins[index] = (value + distance * (1 << shift)) & 0xFFFFFFFF
+                    break
+        return array('I', bins)
+
+def similarity(a, b):
+    """Estimated Jaccard similarity of two signatures"""
+    return sum(1 for x, y in zip(a, b) if x == y) / len(a)
+
+class NearDuplicateClusters:
+    """
+    Leader clustering over a stream of (text, row, column) rows.
+
+    representatives() yields the first row of each cluster and records the
+    rows that joined it; record() keeps the scores written for a
+    representative so fan_out() can copy them to its members.
+    """
+
+    def __init__(self, threshold=0.8, num_perm=64, shingle_size=3):
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm, shingle_size)
+        self.bands, self.band_rows = lsh_bands(num_perm, threshold)
+        self._buckets = [{} for _ in range(self.bands)]
+        self._signatures = {}
+        self.members = {}
+        self._scores = {}
+        self.rows = 0
+
+    @property
+    def duplicates(self):
+        return sum(len(rows) for rows in self.members.values())
+
+    def _band_keys(self, signature):
+        rows = self.band_rows
+        return [hash(signature[band * rows:(band + 1) * rows].tobytes()) for band in range(self.bands)]
+
+    def _find(self, signature, keys):
+        seen = set()
+        for band, key in enumerate(keys):
+            for candidate in self._buckets[band].get(key, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                if similarity(signature, self._signatures[candidate]) >= self.threshold:
+                    return candidate
+        return None
+
+    def representatives(self, rows):
+        """Yield the (text, row, column) rows that start a new cluster"""
+        for text, row, column in rows:
+            self.rows += 1
+            signature = self.hasher.signature(text)
+            if signature is None:
+                yield text, row, column
+                continue
+            keys = self._band_keys(signature)
+            leader = self._find(signature, keys)
+            if leader is not None:
+                self.members[leader].append(row)
+                continue
+            self._signatures[row] = signature
+            self.members[row] = []
+            for band, key in enumerate(keys):
+                self._buckets[band].setdefault(key, []).append(row)
+            yield text, row, column
+
+    def record(self, row, scores):
+        """
+        Keep the scores written for a representative; rows are scored while
+        the stream is still being clustered, so members may join it later
+        """
+        if row in self.members:
+            self._scores[row] = scores
+
+    def fan_out(self):
+        """Yield (member row, scores) for every member whose representative has scores"""
+        for leader, scores in self._scores.items():
+            for row in self.members[leader]:
+                yield row, scores
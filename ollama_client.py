@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+ollama_client.py - Shared Ollama /api/generate client
+One pooled keep-alive session per process, a keep_alive on every request so
+Ollama keeps the model loaded between bursty jobs, connect/read timeouts,
+and a warm_up() that loads models before the first job needs them.
+Streaming calls report time to first token separately from generation time.
+"""
+
+import json
+import os
+import threading
+import time
+
+import requests
+
+from debug_utils import debug_print, debug_error
+
+OLLAMA_GENERATE_URL = os.environ.get('OLLAMA_GENERATE_URL', "http://host.docker.internal:11434/api/generate")
+OLLAMA_KEEP_ALIVE = os.environ.get('OLLAMA_KEEP_ALIVE', '30m')
+
+class GenerationStream:
+    """
+    Tokens of one streaming generate call, with timings.
+
+    Iterate to get response tokens; close() (or leaving the with block)
+    ends the request early. Timings are in seconds from the request:
+    first_token is the time to the first token (queueing and model load
+    included), generation the time from the first token to the last one read.
+    """
+
+    def __init__(self, response, started):
+        self._response = response
+        self.started = started
+        self.first_token = None
+        self.finished = None
+        self.tokens = 0
+        self.done = False
+        self.final = {}
+
+    def __iter__(self):
+        try:
+            for line in self._response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                token = chunk.get("response", "")
+                if self.first_token is None:
+                    self.first_token = time.perf_counter() - self.started
+                self.tokens += 1
+                yield token
+                if chunk.get("done", False):
+                    self.done = True
+                    self.final = chunk
+                    break
+        finally:
+            self.finished = time.perf_counter() - self.started
+
+    @property
+    def generation(self):
+        if self.first_token is None or self.finished is None:
+            return 0.0
+        return self.finished - self.first_token
+
+    @property
+    def elapsed(self):
+        return self.finished if self.finished is not None else time.perf_counter() - self.started
+
+    def close(self):
+        if self.finished is None:
+            self.finished = time.perf_counter() - self.started
+        self._response.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+class OllamaClient:
+    """
+    Pooled client for one Ollama server; safe to share between threads.
+
+    Timeouts are (connect_timeout, read_timeout); the read timeout bounds the
+    wait for each chunk, not the whole generation.
+    """
+
+    def __init__(self, url=OLLAMA_GENERATE_URL, keep_alive=OLLAMA_KEEP_ALIVE, connect_timeout=5, read_timeout=300,
+                 pool_size=4, session=None):
+        self.url = url
+        self.keep_alive = keep_alive
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = session or requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def _payload(self, model, prompt, stream, options):
+        payload = {
+            "model": model,
+            "prompt": prompt,
+            "stream": stream,
+            "keep_alive": self.keep_alive
+        }
+        if options:
+            payload["options"] = options
+        return payload
+
+    def generate(self, model, prompt, options=None):
+        """
+        Non-streaming generate call
+
+        Returns:
+            dict: Ollama's response body ("response" holds the text)
+
+        Raises:
+            requests.exceptions.RequestException: On connection errors, timeouts or HTTP errors
+        """
+        response = self.session.post(self.url, json=self._payload(model, prompt, False, options), timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def stream(self, model, prompt, options=None):
+        """
+        Streaming generate call
+
+        Returns:
+            GenerationStream: Iterate for tokens; close it when done
+
+        Raises:
+            requests.exceptions.RequestException: On connection errors, timeouts or HTTP errors
+        """
+        started = time.perf_counter()
+        response = self.session.post(self.url, json=self._payload(model, prompt, True, options),
+                                     stream=True, timeout=self.timeout)
+        try:
+            response.raise_for_status()
+        except requests.exceptions.RequestException:
+            response.close()
+            raise
+        return GenerationStream(response, started)
+
+    def warm_up(self, models):
+        """
+        Load models into Ollama memory (an empty prompt only loads the model)
+
+        Returns:
+            dict: Seconds taken per model that loaded, None for those that failed
+        """
+        loaded = {}
+        for model in models:
+            started = time.perf_counter()
+            try:
+                self.generate(model, "")
+                loaded[model] = round(time.perf_counter() - started, 3)
+                debug_print(f"Warmed up {model} in {loaded[model]:.2f}s (keep_alive {self.keep_alive})")
+            except requests.exceptions.RequestException as e:
+                loaded[model] = None
+                debug_error(f"Failed to warm up {model}: {str(e)}")
+        return loaded
+
+    def warm_up_async(self, models):
+        """warm_up() on a background thread so a worker can start taking jobs straight away"""
+        thread = threading.Thread(target=self.warm_up, args=(list(models),), daemon=True)
+        thread.start()
+        return thread
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+outbound.py - Shared scheduler for outbound calls (Apps Script, task scheduler)
+Every call to a destination goes through one queue per destination:
+  - a token bucket caps the request rate and a fixed set of sender threads
+    caps concurrency (Apps Script enforces per-user quotas on both)
+  - INTERACTIVE calls (status/header cells the user is watching) are sent
+    before BULK ones (score writes, task uploads)
+  - within a priority class, jobs take turns, so one big sheet cannot
+    starve the others
+  - a call that raises Throttled (429 / quota exceeded) pauses the whole
+    destination and is queued again instead of being dropped
+Queue depth, wait time and throttling are recorded in METRICS.
+"""
+
+import collections
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+from debug_utils import debug_print, debug_error
+from metrics import METRICS
+
+INTERACTIVE = 0
+BULK = 1
+_PRIORITY_NAMES = {INTERACTIVE: 'interactive', BULK: 'bulk'}
+
+class Throttled(Exception):
+    """Raised by a call when the destination reports rate limiting or an exhausted quota"""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class TokenBucket:
+    """rate tokens per second, holding at most burst; pause() empties it for a while"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def delay(self):
+        """Take a token if one is available; otherwise return seconds until one will be"""
+        with self._lock:
+            now = time.monotonic()
+            if now < self._paused_until:
+                return self._paused_until - now
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def pause(self, seconds):
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0
+
+class _Call:
+    def __init__(self, fn, priority, job, retries):
+        self.fn = fn
+        self.priority = priority
+        self.job = job
+        self.retries = retries
+        self.attempts = 0
+        self.queued = time.monotonic()
+        self.future = Future()
+
+class Destination:
+    """
+    Queue, token bucket and sender threads for one outbound endpoint.
+
+    Pending calls are held per priority class as an ordered map of
+    job -> deque; the next call comes from the first job in the highest
+    priority class that has work, and that job then moves to the back.
+    """
+
+    def __init__(self, name, rate, burst, concurrency, max_retries=5, backoff=2.0, max_backoff=60.0):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._queues = {INTERACTIVE: collections.OrderedDict(), BULK: collections.OrderedDict()}
+        self._depth = 0
+        self._ready = threading.Condition()
+        for number in range(concurrency):
+            threading.Thread(target=self._sender, name=f"outbound-{name}-{number}", daemon=True).start()
+
+    @property
+    def depth(self):
+        return self._depth
+
+    def submit(self, fn, priority=BULK, job=None, retries=None):
+        """Queue fn() and return a Future for its result"""
+        call = _Call(fn, priority, job, self.max_retries if retries is None else retries)
+        self._enqueue(call)
+        return call.future
+
+    def _enqueue(self, call, front=False):
+        with self._ready:
+            calls = self._queues[call.priority].setdefault(call.job, collections.deque())
+            if front:
+                calls.appendleft(call)
+            else:
+                calls.append(call)
+            self._depth += 1
+            METRICS.set('outbound_queue_depth', self._depth, destination=self.name)
+            self._ready.notify()
+
+    def _next(self):
+        with self._ready:
+            while True:
+                for priority in (INTERACTIVE, BULK):
+                    jobs = self._queues[priority]
+                    if jobs:
+                        job, calls = next(iter(jobs.items()))
+                        call = calls.popleft()
+                        if calls:
+                            jobs.move_to_end(job)
+                        else:
+                            del jobs[job]
+                        self._depth -= 1
+                        METRICS.set('outbound_queue_depth', self._depth, destination=self.name)
+                        return call
+                self._ready.wait()
+
+    def _sender(self):
+        while True:
+            call = self._next()
+            delay = self.bucket.delay()
+            while delay > 0:
+                time.sleep(delay)
+                delay = self.bucket.delay()
+
+            if call.attempts == 0:
+                METRICS.observe('outbound_wait', time.monotonic() - call.queued,
+                                destination=self.name, priority=_PRIORITY_NAMES[call.priority])
+            call.attempts += 1
+            try:
+                result = call.fn()
+            except Throttled as e:
+                METRICS.incr('outbound_throttled', destination=self.name)
+                if call.attempts > call.retries:
+                    debug_error(f"{self.name}: still throttled after {call.attempts} attempt(s): {str(e)}")
+                    call.future.set_exception(e)
+                    continue
+                pause = e.retry_after or min(self.max_backoff, self.backoff * 2 ** (call.attempts - 1))
+                debug_print(f"{self.name}: throttled ({str(e)}), pausing {pause:.1f}s with {self._depth} call(s) queued")
+                # Back-pressure: every sender for this destination waits, and the call keeps its place in line
+                self.bucket.pause(pause)
+                self._enqueue(call, front=True)
+                continue
+            except Exception as e:
+                call.future.set_exception(e)
+                continue
+            call.future.set_result(result)
+
+class OutboundScheduler:
+    """Destinations created on first use, configured from env <NAME>_RATE / _BURST / _CONCURRENCY"""
+
+    DEFAULTS = {
+        'sheets': (5.0, 10, 4),
+        'scheduler': (2.0, 4, 2)
+    }
+
+    def __init__(self):
+        self._destinations = {}
+        self._lock = threading.Lock()
+
+    def destination(self, name):
+        with self._lock:
+            if name not in self._destinations:
+                rate, burst, concurrency = self.DEFAULTS.get(name, (5.0, 10, 4))
+                prefix = name.upper()
+                self._destinations[name] = Destination(
+                    name,
+                    rate=float(os.environ.get(f'{prefix}_RATE', rate)),
+                    burst=int(os.environ.get(f'{prefix}_BURST', burst)),
+                    concurrency=int(os.environ.get(f'{prefix}_CONCURRENCY', concurrency))
+                )
+            return self._destinations[name]
+
+    def call(self, name, fn, priority=BULK, job=None, retries=None):
+        """
+        Run fn() through the named destination's queue and wait for it
+
+        Returns:
+            The result of fn()
+
+        Raises:
+            Throttled: If the destination kept throttling after every retry
+            Exception: Whatever fn() raised otherwise
+        """
+        return self.destination(name).submit(fn, priority, job, retries).result()
+
+    def depths(self):
+        with self._lock:
+            return {name: destination.depth for name, destination in self._destinations.items()}
+
+# Process-wide scheduler shared by every job in --serve mode
+OUTBOUND = OutboundScheduler()
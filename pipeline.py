@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+pipeline.py - Small asyncio stage runner for process_job()
+Stages are declared with the stages they depend on; every stage starts as
+soon as its dependencies finish, so independent I/O (Sheets writes, job
+store, uploads) overlaps the LLM call. Stage functions are ordinary
+blocking functions run in worker threads.
+"""
+
+import asyncio
+import time
+
+from debug_utils import debug_print, debug_error
+
+class StageSkipped(Exception):
+    """Raised for a stage whose dependency failed"""
+
+class Pipeline:
+    """
+    add() stages in dependency order, then run_sync().
+
+    Each stage function receives the dict of results of the stages that
+    have finished so far (always including its own dependencies) and
+    returns its own result. A failing stage skips everything that depends
+    on it; independent stages still run.
+    """
+
+    def __init__(self, name='job'):
+        self.name = name
+        self.results = {}
+        self.errors = {}
+        self.timings = {}
+        self._stages = {}
+
+    def add(self, name, fn, after=()):
+        for dependency in after:
+            if dependency not in self._stages:
+                raise ValueError(f"Stage {name} depends on unknown stage {dependency}")
+        self._stages[name] = (fn, tuple(after))
+
+    async def run(self):
+        started = time.perf_counter()
+        tasks = {}
+
+        async def _run_stage(name, fn, after):
+            for dependency in after:
+                try:
+                    await tasks[dependency]
+                except Exception:
+                    self.errors[name] = StageSkipped(f"{dependency} did not complete")
+                    raise self.errors[name]
+            start = time.perf_counter() - started
+            try:
+                self.results[name] = await asyncio.to_thread(fn, self.results)
+            except Exception as e:
+                self.errors[name] = e
+                raise
+            finally:
+                self.timings[name] = (start, time.perf_counter() - started)
+            return self.results[name]
+
+        for name, (fn, after) in self._stages.items():
+            tasks[name] = asyncio.ensure_future(_run_stage(name, fn, after))
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        self.timings['total'] = (0.0, time.perf_counter() - started)
+        return self.results
+
+    def run_sync(self):
+        """Run the pipeline on a fresh event loop (safe from worker threads)"""
+        return asyncio.run(self.run())
+
+    def critical_path(self):
+        """Chain of stages that determined the total time, first to last"""
+        finished = {name: end for name, (_, end) in self.timings.items() if name in self._stages}
+        if not finished:
+            return []
+        path = [max(finished, key=finished.get)]
+        while True:
+            after = [dep for dep in self._stages[path[-1]][1] if dep in finished]
+            if not after:
+                break
+            path.append(max(after, key=finished.get))
+        return list(reversed(path))
+
+    def report(self):
+        """Log per-stage start/end/duration and the critical path"""
+        for name in self._stages:
+            if name not in self.timings:
+                debug_error(f"[{self.name}] {name}: skipped ({self.errors.get(name)})")
+                continue
+            start, end = self.timings[name]
+            status = f"failed ({self.errors[name]})" if name in self.errors else "ok"
+            debug_print(f"[{self.name}] {name}: {start:.3f}s -> {end:.3f}s ({end - start:.3f}s) {status}")
+        debug_print(f"[{self.name}] total {self.timings.get('total', (0, 0))[1]:.3f}s, "
+                    f"critical path: {' -> '.join(self.critical_path())}")
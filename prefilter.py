@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+prefilter.py - Deterministic phrase pre-filter ahead of LLM row scoring
+Phrases are pulled out of the positive_case / negative_case text of the
+binary_json answer (quoted phrases and "- item" / comma separated lists)
+and compiled into one Aho-Corasick automaton, so every transcript is
+scanned once however many phrases the rubric lists. Rows with clear
+one-sided evidence get their scores here; everything else still goes to
+the model.
+"""
+
+import re
+from collections import deque
+
+# Longer list items are descriptions ("details supporting this"), not phrases to look for
+MAX_PHRASE_WORDS = 5
+
+_STOPWORDS = frozenset((
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in', 'is', 'it', 'of',
+    'on', 'or', 'that', 'the', 'this', 'to', 'was', 'were', 'with', 'yes', 'no', 'not',
+    'text', 'call', 'e.g', 'eg', 'etc', 'such as', 'like'
+))
+_QUOTED_RE = re.compile(r'"([^"]{2,80})"|“([^”]{2,80})”|(?<!\w)\'([^\']{2,80})\'(?!\w)')
+_SPLIT_RE = re.compile(r'\s+-\s+|^-\s+|[,;:\n()\[\]]|\s+or\s+|\.\s', re.MULTILINE)
+
+def normalize_text(text):
+    """Lowercase, drop apostrophes (transcripts write "dont"/"Im") and collapse whitespace"""
+    text = str(text).lower().replace("'", '').replace('’', '')
+    return ' '.join(text.split())
+
+def extract_phrases(case_text):
+    """
+    Candidate match phrases from one case description
+
+    Returns:
+        set: Normalized phrases of 1..MAX_PHRASE_WORDS words
+    """
+    if not case_text:
+        return set()
+    case_text = str(case_text)
+    candidates = [next(group for group in match if group) for match in _QUOTED_RE.findall(case_text)]
+    candidates.extend(_SPLIT_RE.split(_QUOTED_RE.sub(' , ', case_text)))
+
+    phrases = set()
+    for candidate in candidates:
+        phrase = normalize_text(candidate).strip(' .!?"-*…')
+        if not phrase or phrase in _STOPWORDS:
+            continue
+        if len(phrase.split()) <= MAX_PHRASE_WORDS and len(phrase) >= 3:
+            phrases.add(phrase)
+    return phrases
+
+class AhoCorasick:
+    """
+    Multi-pattern matcher: all patterns are found in one pass over the text.
+
+    Matches are whole words only (the characters either side of a match must
+    not be letters or digits).
+    """
+
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        for index, pattern in enumerate(self.patterns):
+            state = 0
+            for char in pattern:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                state = next_state
+            self._out[state].append(index)
+
+        # Breadth-first so every failure link points at an already finished state
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._out[next_state] = self._out[next_state] + self._out[self._fail[next_state]]
+
+    def iter_matches(self, text):
+        """Yield (start, pattern index) for every whole-word match in text"""
+        goto = self._goto
+        fail = self._fail
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for index in self._out[state]:
+                start = position - len(self.patterns[index]) + 1
+                end = position + 1
+                if start > 0 and text[start - 1].isalnum():
+                    continue
+                if end < len(text) and text[end].isalnum():
+                    continue
+                yield start, index
+
+class PhraseFilter:
+    """
+    Decide rows from positive/negative phrase evidence alone.
+
+    A row is decided when at least min_hits distinct phrases from one case
+    appear and none from the other; otherwise it is ambiguous and classify()
+    returns None. Phrases listed under both cases are ignored.
+    """
+
+    def __init__(self, positive_phrases, negative_phrases, min_hits=2):
+        positive = set(positive_phrases)
+        negative = set(negative_phrases)
+        shared = positive & negative
+        positive -= shared
+        negative -= shared
+        self.min_hits = min_hits
+        self._positive_count = len(positive)
+        self._matcher = AhoCorasick(sorted(positive) + sorted(negative))
+        self.checked = 0
+        self.decided = 0
+
+    @classmethod
+    def from_binary_json(cls, binary_json, min_hits=2):
+        return cls(extract_phrases(binary_json.get('positive_case')),
+                   extract_phrases(binary_json.get('negative_case')),
+                   min_hits=min_hits)
+
+    @property
+    def phrase_count(self):
+        return len(self._matcher.patterns)
+
+    def count_hits(self, text):
+        """Number of distinct positive and negative phrases found in text"""
+        found = {index for _, index in self._matcher.iter_matches(normalize_text(text))}
+        positive = sum(1 for index in found if index < self._positive_count)
+        return positive, len(found) - positive
+
+    def classify(self, text):
+        """
+        Returns:
+            dict: {'about', 'not_about', 'unknown'} scores for a decided row, or None if ambiguous
+        """
+        self.checked += 1
+        if not self.phrase_count:
+            return None
+        positive, negative = self.count_hits(text)
+        if positive >= self.min_hits and negative == 0:
+            scores = {'about': 1.0, 'not_about': 0.0, 'unknown': 0.0}
+        elif negative >= self.min_hits and positive == 0:
+            scores = {'about': 0.0, 'not_about': 1.0, 'unknown': 0.0}
+        else:
+            return None
+        self.decided += 1
+        return scores
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+prompts.py - Rating prompt assembly
+Every rating prompt is laid out as a static prefix (system instructions,
+the rubric(s), the answer format) followed by the variable transcript(s).
+Requests for the same rubric then share a byte-identical prefix, so Ollama
+can reuse its KV cache for it and only evaluates the transcript tokens.
+
+The multi-question layout puts several rubrics in one prefix and rates one
+transcript against all of them in a single request; the answer is a JSON
+object keyed by question number (see scoring_engine.parse_multi_scores),
+and split_columns() maps it back to each question's sheet columns.
+"""
+
+SYSTEM_PROMPT = ("You rate phone call transcripts. Read the rubric, then the call, and score how well the call "
+                 "fits each case with a float between 0 and 1.")
+
+# Columns written per question: Not_About, About, Unknown
+COLUMNS_PER_QUESTION = 3
+
+def build_rubric(binary_json):
+    """Rubric for one binary_json; also written to the sheet header and the task file"""
+    return "Rate these calls by About_"+binary_json['binary_topic']+"_float is ( "+binary_json['positive_case']+" ) Not_About_"+binary_json['binary_topic']+" ( "+binary_json['negative_case']+" ) Unknown_float ("+binary_json['unknown']+") This is the call be sure to rate with a float make sure not all of them are 0 please make sure to rate right"
+
+def row_prefix(question):
+    return f"{SYSTEM_PROMPT}\n\n{question}\n\nOutput only JSON with the three float scores.\n\nCall:\n"
+
+def build_row_prompt(question, text):
+    """Rating prompt for one row: the static rubric prefix followed by the call text"""
+    return row_prefix(question) + str(text)
+
+def batch_prefix(question):
+    return (f"{SYSTEM_PROMPT}\n\n{question}\n\nRate each call below separately. Output only a JSON array with "
+            f"one object per call, in order, each with \"call\" (its number) and the three float scores.\n\n")
+
+def build_batch_prompt(question, texts):
+    """Rating prompt for several rows in one request, answered as a JSON array in call order"""
+    return batch_prefix(question) + "\n\n".join(f"Call {number}:\n{text}" for number, text in enumerate(texts, 1))
+
+def multi_prefix(questions):
+    rubrics = "\n\n".join(f"Question {number}: {question}" for number, question in enumerate(questions, 1))
+    return (f"{SYSTEM_PROMPT}\n\nRate the call below against each of these {len(questions)} questions "
+            f"separately.\n\n{rubrics}\n\nOutput only a JSON object with one key per question number "
+            f"(\"1\" to \"{len(questions)}\"), each holding that question's three float scores.\n\nCall:\n")
+
+def build_multi_prompt(questions, text):
+    """Rating prompt for one row against several questions: every rubric in the prefix, then the call text"""
+    return multi_prefix(questions) + str(text)
+
+def split_columns(column, results):
+    """
+    Map per-question results back to the sheet: question i's block starts
+    COLUMNS_PER_QUESTION * i columns after column (the first question's)
+
+    Yields:
+        (block column, scores) for every question that has scores
+    """
+    for index, scores in enumerate(results):
+        if scores:
+            yield column + COLUMNS_PER_QUESTION * index, scores
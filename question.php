@@ -26,18 +26,19 @@ error_log("Question received: $question for rows: " . json_encode($rowNumbers));
 error_log("Selected columns: " . json_encode($selectedColumnNames));
 
 // Asynchronously call Python script to write data to file
-callPythonAsync([
+$queued = callPythonAsync([
     'status' => 'success',
     'question' => $question,
     'sheet_id' => $sheet_id,
     'sheet_name' => $sheet_name,
     'rows' => $rowNumbers,
-    'allRowsData' => $allRowsData,
     // NEW: Add selected column information
     'selected_columns' => $selectedColumnNames,
     'start_column' => (int)$start_column,
-    'num_columns' => (int)$num_columns
-]);
+    'num_columns' => (int)$num_columns,
+    // Last, so the processor can stream the rows after reading the metadata
+    'allRowsData' => $allRowsData
+], $reason);
 
 // Process the question for each row
 $answers = [];
@@ -52,6 +53,9 @@ if (is_array($allRowsData)) {
 // Return the responses
 echo json_encode([
     'status' => 'success',
+    // false when the worker daemon rejected the job (reason 'busy'): no scores will be written, retry later
+    'queued' => $queued,
+    'reason' => $queued ? null : $reason,
     'answers' => $answers,
     'question' => $question,
     'sheet_id' => $sheet_id,
@@ -68,28 +72,42 @@ echo json_encode([
  * This function returns immediately without waiting for Python to finish
  * Modified to print Python output to Docker container for debugging
  */
-function callPythonAsync($data) {
+function callPythonAsync($data, &$reason = null) {
     // Path to Python script
     $pythonScript = __DIR__ . '/async_processor.py';
     
     // Check if Python script exists
     if (!file_exists($pythonScript)) {
         error_log("Python script not found: $pythonScript");
+        $reason = 'script_missing';
         return false;
     }
     
     // Convert data to JSON
     $jsonData = json_encode($data);
     
-    // Escape the JSON for shell
-    $escapedData = escapeshellarg($jsonData);
+    // Hand the job to the persistent worker daemon (async_processor.py --serve) if it is running
+    $queued = sendJobToDaemon($jsonData, $reason);
+    if ($queued !== null) {
+        return $queued;
+    }
+    
+    // Write the JSON to a temp file; passing it through echo hits the
+    // shell argument size limit on large selections
+    $inputFile = tempnam(sys_get_temp_dir(), 'job');
+    if ($inputFile === false || file_put_contents($inputFile, $jsonData) === false) {
+        error_log("Could not write Python job input file");
+        $reason = 'input_file';
+        return false;
+    }
     
     // Build the command
     // Redirect Python output to Apache error log (which Docker captures)
+    // The processor deletes the input file once it has read it
     $command = sprintf(
-        'echo %s | python3 %s 2>&1 | while IFS= read -r line; do echo "[PYTHON] $line" >&2; done &',
-        $escapedData,
-        escapeshellarg($pythonScript)
+        'python3 %s --input %s --remove-input 2>&1 | sed -u "s/^/[PYTHON] /" >&2 &',
+        escapeshellarg($pythonScript),
+        escapeshellarg($inputFile)
     );
     
     // Execute the command asynchronously
@@ -98,6 +116,32 @@ function callPythonAsync($data) {
     return true;
 }
 
+/**
+ * Send a job to the async_processor.py worker daemon over its Unix socket
+ * Returns true if queued, false if the daemon rejected it ($reason gets its status, e.g. 'busy'),
+ * null if it is not running
+ */
+function sendJobToDaemon($jsonData, &$reason = null) {
+    $socketPath = getenv('PROCESSOR_SOCKET') ?: '/tmp/async_processor.sock';
+    
+    $socket = @stream_socket_client('unix://' . $socketPath, $errno, $errstr, 1);
+    if ($socket === false) {
+        return null;
+    }
+    
+    fwrite($socket, $jsonData);
+    stream_socket_shutdown($socket, STREAM_SHUT_WR);
+    $reply = json_decode(stream_get_contents($socket), true);
+    fclose($socket);
+    
+    if (($reply['status'] ?? '') === 'queued') {
+        return true;
+    }
+    
+    error_log("Python worker daemon did not accept job: " . json_encode($reply));
+    $reason = $reply['status'] ?? 'no_reply';
+    return false;
+}
 
 function processQuestion($question, $data) {
     // Replace this with your actual AI/processing logic
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+question_cache.py - On-disk cache for convert_question_to_binary_json results
+Shared by async_processor.py and runQuestion.py so a repeated question skips
+the deepseek-r1 call entirely
+
+Entries are content addressed: the file name is a sha256 of the normalized
+question, model, prompt template version and generation options. Each entry
+is one small JSON file, so concurrent processes can share the directory.
+"""
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+
+from debug_utils import debug_error
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    'QUESTION_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads', 'question_cache')
+)
+
+def normalize_question(question):
+    """Lowercase and collapse whitespace so trivially different spellings share an entry"""
+    return re.sub(r'\s+', ' ', question or '').strip().lower()
+
+def cache_key(question, model, template_version, options=None):
+    """Hash of everything that can change the model's answer"""
+    material = json.dumps({
+        'question': normalize_question(question),
+        'model': model,
+        'template_version': template_version,
+        'options': options or {}
+    }, sort_keys=True)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+class QuestionCache:
+    """
+    TTL + size-bounded LRU cache of parsed binary_topic/positive_case/negative_case/unknown JSON.
+
+    Recency is tracked with the entry file's mtime, which is bumped on every hit.
+    With bypass=True lookups always miss but fresh results are still stored.
+    If the cache directory cannot be created the cache falls back to bypass
+    and stores nothing either.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, ttl=7 * 24 * 3600, max_entries=500, bypass=None):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_entries = max_entries
+        if bypass is None:
+            bypass = os.environ.get('QUESTION_CACHE_BYPASS', '') not in ('', '0')
+        self.bypass = bypass
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disabled = False
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+        except OSError as e:
+            debug_error(f"Question cache disabled, cannot create {self.cache_dir}: {str(e)}")
+            self.bypass = self.disabled = True
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + '.json')
+
+    def get(self, question, model, template_version, options=None):
+        """Return the cached binary JSON dict, or None on a miss"""
+        if self.bypass:
+            self.misses += 1
+            return None
+
+        path = self._path(cache_key(question, model, template_version, options))
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+        if self.ttl is not None and time.time() - entry.get('created', 0) > self.ttl:
+            self._remove(path)
+            self.misses += 1
+            return None
+
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        self.hits += 1
+        return entry['result']
+
+    def put(self, question, model, template_version, result, options=None):
+        """Store a parsed result and evict least recently used entries over max_entries"""
+        if self.disabled:
+            return
+        path = self._path(cache_key(question, model, template_version, options))
+        entry = {
+            'created': time.time(),
+            'question': question,
+            'model': model,
+            'template_version': template_version,
+            'result': result
+        }
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(entry, f)
+            # mkstemp creates the file owner-only; the daemon and the PHP fallback run as different users
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except OSError:
+            self._remove(tmp_path)
+            raise
+        self._evict()
+
+    def _evict(self):
+        if self.max_entries is None:
+            return
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                entries.append((os.path.getmtime(path), path))
+            except OSError:
+                continue
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort()
+        for _, path in entries[:len(entries) - self.max_entries]:
+            self._remove(path)
+            self.evictions += 1
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def stats(self):
+        """Hit/miss counters for this process"""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+result_cache.py - Persistent per-transcript scoring result cache
+The same transcripts are rated against the same rubric run after run; a
+row whose (text, rubric, model, prompt version) was scored before gets
+its scores from here instead of from the model.
+
+Entries live in one SQLite table (WAL mode, shared by the --serve workers
+and one-shot processes), bounded to max_entries by least recent use.
+
+Usage:
+    python3 result_cache.py stats                          entry count and per-version breakdown
+    python3 result_cache.py invalidate [model] [version]   drop entries (all, or one model/version)
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+
+from debug_utils import debug_print, debug_error
+from question_cache import normalize_question
+
+DEFAULT_DB = os.environ.get(
+    'RESULT_CACHE_DB',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads', 'result_cache.sqlite3')
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    template_version TEXT NOT NULL,
+    scores TEXT NOT NULL,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used);
+CREATE INDEX IF NOT EXISTS results_version ON results (model, template_version);
+"""
+
+# Eviction runs after this many puts rather than after every one
+_EVICT_EVERY = 100
+# After a database error the cache is skipped for this many seconds before it is tried again
+_RETRY_AFTER = 60
+
+def text_hash(text):
+    """Hash of a transcript; whitespace-only differences share an entry"""
+    return hashlib.sha256(re.sub(r'\s+', ' ', str(text)).strip().encode('utf-8')).hexdigest()
+
+def rubric_hash(rubric):
+    return hashlib.sha256(normalize_question(rubric).encode('utf-8')).hexdigest()
+
+def result_key(text, rubric, model, template_version):
+    material = '\0'.join((text_hash(text), rubric_hash(rubric), model, template_version))
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+class ResultCache:
+    """
+    Size-bounded LRU cache of {'about', 'not_about', 'unknown'} scores.
+
+    A model or prompt version change makes every old entry miss (both
+    are part of the key); retain_only() also deletes them to reclaim space.
+    With bypass=True lookups always miss but fresh results are still stored.
+
+    The cache is best-effort: a database that can't be opened, is read-only
+    or stays locked is logged, and lookups miss and stores are skipped
+    until it works again.
+    """
+
+    def __init__(self, path=DEFAULT_DB, max_entries=100000, bypass=None):
+        self.path = path
+        self.max_entries = max_entries
+        if bypass is None:
+            bypass = os.environ.get('RESULT_CACHE_BYPASS', '') not in ('', '0')
+        self.bypass = bypass
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._puts = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._failed_at = None
+        try:
+            self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            with self._lock, self._conn:
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute("PRAGMA synchronous=NORMAL")
+                self._conn.executescript(SCHEMA)
+        except sqlite3.Error as e:
+            self._fail(f"open {path}", e)
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    @property
+    def available(self):
+        """False if the database could not be opened or failed less than _RETRY_AFTER seconds ago"""
+        if self._conn is None:
+            return False
+        return self._failed_at is None or time.monotonic() - self._failed_at >= _RETRY_AFTER
+
+    def _fail(self, action, error):
+        debug_error(f"Result cache {action} failed, continuing uncached: {str(error)}")
+        self._failed_at = time.monotonic()
+
+    def get(self, text, rubric, model, template_version):
+        """
+        Return the cached scores dict, or None on a miss
+        template_version may be a tuple of versions, tried in order (one lookup either way)
+        """
+        if self.bypass or not self.available:
+            self.misses += 1
+            return None
+        versions = (template_version,) if isinstance(template_version, str) else tuple(template_version)
+        keys = [result_key(text, rubric, model, version) for version in versions]
+        scores = None
+        try:
+            with self._lock, self._conn:
+                found = dict(self._conn.execute(
+                    f"SELECT key, scores FROM results WHERE key IN ({', '.join('?' * len(keys))})", keys
+                ).fetchall())
+                key = next((key for key in keys if key in found), None)
+                if key is not None:
+                    scores = found[key]
+                    self._conn.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+        except sqlite3.Error as e:
+            self._fail("lookup", e)
+            scores = None
+        if scores is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(scores)
+
+    def put(self, text, rubric, model, template_version, scores):
+        """Store one row's scores and evict least recently used entries over max_entries"""
+        if not self.available:
+            return
+        key = result_key(text, rubric, model, template_version)
+        now = time.time()
+        try:
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO results (key, model, template_version, scores, created, last_used) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, model, template_version, json.dumps(scores), now, now)
+                )
+                self._puts += 1
+                if self._puts % _EVICT_EVERY == 0:
+                    self._evict()
+        except sqlite3.Error as e:
+            self._fail("store", e)
+
+    def _evict(self):
+        if self.max_entries is None:
+            return
+        count = self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        if count <= self.max_entries:
+            return
+        cursor = self._conn.execute(
+            "DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY last_used LIMIT ?)",
+            (count - self.max_entries,)
+        )
+        self.evictions += cursor.rowcount
+
+    def invalidate(self, model=None, template_version=None):
+        """
+        Delete every entry, or only those for one model and/or template version
+
+        Returns:
+            int: Entries deleted
+        """
+        clauses = []
+        params = []
+        if model is not None:
+            clauses.append("model = ?")
+            params.append(model)
+        if template_version is not None:
+            clauses.append("template_version = ?")
+            params.append(template_version)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock, self._conn:
+            return self._conn.execute(f"DELETE FROM results{where}", params).rowcount
+
+    def retain_only(self, model, template_versions):
+        """Delete entries written for any other model or for a template version not in template_versions"""
+        if not self.available:
+            return 0
+        versions = sorted(set(template_versions))
+        placeholders = ', '.join('?' * len(versions))
+        try:
+            with self._lock, self._conn:
+                deleted = self._conn.execute(
+                    f"DELETE FROM results WHERE model != ? OR template_version NOT IN ({placeholders})",
+                    [model] + versions
+                ).rowcount
+        except sqlite3.Error as e:
+            self._fail("cleanup", e)
+            return 0
+        if deleted:
+            debug_print(f"Result cache dropped {deleted} entries from older models/templates")
+        return deleted
+
+    def stats(self):
+        """Hit/miss counters for this process"""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+    def close(self):
+        if self._conn is None:
+            return
+        with self._lock:
+            self._conn.close()
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] not in ('stats', 'invalidate'):
+        print(__doc__)
+        sys.exit(1)
+    cache = ResultCache()
+    if not cache.available:
+        sys.exit(1)
+    try:
+        if sys.argv[1] == 'stats':
+            with cache._lock:
+                rows = cache._conn.execute(
+                    "SELECT model, template_version, COUNT(*) FROM results GROUP BY model, template_version"
+                ).fetchall()
+            print(json.dumps([{'model': model, 'template_version': version, 'entries': count}
+                              for model, version, count in rows], indent=2))
+        else:
+            model = sys.argv[2] if len(sys.argv) > 2 else None
+            version = sys.argv[3] if len(sys.argv) > 3 else None
+            print(f"Deleted {cache.invalidate(model, version)} entries")
+    finally:
+        cache.close()
+
+if __name__ == '__main__':
+    main()
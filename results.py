@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+results.py - Columnar post-processing of a job's row scores
+Each question's scores are collected into one float32 array (rows x
+Not_About / About / Unknown) and handled in vectorized passes instead of
+per-row Python:
+  - validate: NaN, negative and above-1 values are counted and clipped
+  - renormalize: every row is scaled to sum to 1.0, as the rubric asks
+  - flag degenerate rows: all zero (what the rating prompt pleads against)
+    or all three scores equal, i.e. no decision
+  - summary statistics per question/topic
+Each run of consecutive scored rows goes back to the sheet as one range
+write; rows without scores are left out, so their cells keep what they
+held. The block can be exported as CSV (or Parquet when pyarrow is
+installed) with a summary JSON next to it.
+
+NumPy is optional: without it NUMPY_AVAILABLE is False and callers keep
+writing scores cell by cell.
+"""
+
+import json
+import re
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+from debug_utils import debug_error
+
+# Sheet column order of a question's block (see write_scores in async_processor.py)
+SCORE_KEYS = ('not_about', 'about', 'unknown')
+
+class ScoreTable:
+    """
+    One question's scores for a contiguous block of sheet rows starting at first_row.
+
+    add() as scores arrive (rows never added stay NaN), then process() once;
+    normalized, present, invalid, degenerate and renormalized are set by process().
+    """
+
+    def __init__(self, first_row, rows, topic=''):
+        if not NUMPY_AVAILABLE:
+            raise RuntimeError("ScoreTable needs numpy")
+        self.first_row = first_row
+        self.topic = topic
+        self.values = np.full((max(rows, 1), len(SCORE_KEYS)), np.nan, dtype=np.float32)
+        self.normalized = None
+
+    def add(self, row, scores):
+        index = row - self.first_row
+        if index < 0:
+            raise ValueError(f"Row {row} is before the table's first row {self.first_row}")
+        if index >= len(self.values):
+            grow = max(index + 1 - len(self.values), len(self.values))
+            self.values = np.vstack([self.values, np.full((grow, len(SCORE_KEYS)), np.nan, dtype=np.float32)])
+        self.values[index] = [scores.get(key, np.nan) for key in SCORE_KEYS]
+
+    def process(self, tolerance=0.01):
+        """
+        Validate, renormalize and flag every row in one pass
+
+        Returns:
+            dict: summary()
+        """
+        values = self.values
+        self.present = ~np.isnan(values).all(axis=1)
+        self.invalid = self.present & (np.isnan(values) | (values < 0) | (values > 1)).any(axis=1)
+        clean = np.clip(np.nan_to_num(values, nan=0.0), 0.0, 1.0)
+        totals = clean.sum(axis=1)
+        self.degenerate = self.present & ((totals == 0) | (np.ptp(clean, axis=1) == 0))
+        self.renormalized = self.present & (totals > 0) & (np.abs(totals - 1.0) > tolerance)
+        self.normalized = np.divide(clean, totals[:, None], out=clean, where=totals[:, None] > 0)
+        self.normalized[~self.present] = np.nan
+        return self.summary()
+
+    def summary(self):
+        """Counts, per-score mean / std and the label (highest score) distribution of the processed rows"""
+        scored = self.normalized[self.present]
+        decided = self.normalized[self.present & ~self.degenerate]
+        labels = np.bincount(decided.argmax(axis=1), minlength=len(SCORE_KEYS)) if len(decided) else [0] * len(SCORE_KEYS)
+        return {
+            'topic': self.topic,
+            'rows': len(self.values),
+            'scored': int(self.present.sum()),
+            'missing': int((~self.present).sum()),
+            'invalid': int(self.invalid.sum()),
+            'renormalized': int(self.renormalized.sum()),
+            'degenerate': int(self.degenerate.sum()),
+            'mean': {key: round(float(value), 4) for key, value in zip(SCORE_KEYS, scored.mean(axis=0))} if len(scored) else {},
+            'std': {key: round(float(value), 4) for key, value in zip(SCORE_KEYS, scored.std(axis=0))} if len(scored) else {},
+            'labels': {key: int(count) for key, count in zip(SCORE_KEYS, labels)}
+        }
+
+    def runs(self, decimals=4):
+        """
+        The processed scores as one range per run of consecutive scored rows;
+        unscored rows fall between runs and are never written
+
+        Yields:
+            (first sheet row, [[not_about, about, unknown], ...])
+        """
+        # Run boundaries are where present flips: starts at even positions, ends at odd ones
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], self.present.astype(np.int8), [0]))))
+        values = np.round(self.normalized.astype(np.float64), decimals)
+        for start, end in edges.reshape(-1, 2):
+            yield self.first_row + int(start), values[start:end].tolist()
+
+def export_tables(tables, path, fmt='csv'):
+    """
+    Write processed tables side by side, one row per sheet row: the row
+    number, then <topic>_not_about / _about / _unknown / _degenerate per
+    question (prefixed q1_, q2_, ... when there are several), and
+    path + '.summary.json' with every table's summary()
+
+    Returns:
+        str: The path written (".parquet" replaces ".csv" for Parquet)
+    """
+    names = ['row']
+    columns = [np.arange(len(tables[0].values)) + tables[0].first_row]
+    for number, table in enumerate(tables, 1):
+        prefix = re.sub(r'\W+', '_', table.topic or 'question').strip('_')
+        if len(tables) > 1:
+            prefix = f"q{number}_{prefix}"
+        names.extend(f"{prefix}_{key}" for key in SCORE_KEYS + ('degenerate',))
+        columns.extend(table.normalized[:len(columns[0]), index] for index in range(len(SCORE_KEYS)))
+        columns.append(table.degenerate[:len(columns[0])].astype(np.int8))
+
+    if fmt == 'parquet':
+        try:
+            import pyarrow
+            import pyarrow.parquet
+            path = path[:-len('.csv')] + '.parquet' if path.endswith('.csv') else path
+            pyarrow.parquet.write_table(pyarrow.table(dict(zip(names, columns))), path, compression='zstd')
+        except ImportError:
+            debug_error("pyarrow is not installed, exporting CSV instead")
+            fmt = 'csv'
+    if fmt != 'parquet':
+        formats = ['%d'] + ['%.4f', '%.4f', '%.4f', '%d'] * len(tables)
+        np.savetxt(path, np.column_stack(columns), delimiter=',', fmt=formats, header=','.join(names), comments='')
+
+    with open(path + '.summary.json', 'w') as f:
+        json.dump([table.summary() for table in tables], f, indent=2)
+    return path
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+scoring_engine.py - In-process per-row scoring against Ollama
+Alternative to pushing a .task file to the external scheduler: every row text
+is rated with the prompts assembled in prompts.py, with a bounded number of
+requests in flight over one shared OllamaClient
+"""
+
+import collections
+import json
+import re
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from debug_utils import debug_print, debug_error
+from ollama_client import OllamaClient, OLLAMA_GENERATE_URL
+from prompts import build_row_prompt, build_batch_prompt, build_multi_prompt
+DEFAULT_MODEL = "deepseek-r1:7b"
+
+# Bump when build_row_prompt() / build_batch_prompt() / build_multi_prompt() change so cached row scores are not reused
+ROW_PROMPT_VERSION = "row-v2"
+BATCH_PROMPT_VERSION = "batch-v1"
+MULTI_PROMPT_VERSION = "multi-v1"
+
+_OPTIONS = {
+    "temperature": 0.1
+}
+
+# Fallback for answers that are not valid JSON; topic keys can hold any punctuation but quotes, ':' and '='
+_SCORE_RE = re.compile(r'"?([A-Za-z][^"\n:=]*?)"?\s*[:=]\s*"?(-?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][-+]?\d+)?)')
+
+def _score_name(name):
+    """Map an About_<topic>_float / Not_About_<topic> / Unknown_float key to about/not_about/unknown"""
+    key = name.strip().lower()
+    if key.startswith('not_about'):
+        return 'not_about'
+    if key.startswith('about'):
+        return 'about'
+    if key.startswith('unknown'):
+        return 'unknown'
+    return None
+
+class Scores(dict):
+    """A scores dict tagged with the version of the prompt that produced it (for the result cache)"""
+
+    def __init__(self, scores, version):
+        super().__init__(scores)
+        self.version = version
+
+def _score_value(value):
+    """A score as float: numbers and numeric strings ("0.8", ".8", "1e-3"); None for anything else"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value.strip())
+        except ValueError:
+            return None
+    return None
+
+def _entry_scores(entry):
+    scores = {}
+    for name, value in entry.items():
+        key = _score_name(str(name))
+        value = _score_value(value)
+        if key and value is not None:
+            scores.setdefault(key, value)
+    return scores
+
+def parse_scores(text):
+    """
+    Pull the About_<topic>_float / Not_About_<topic> / Unknown_float values out of a model answer
+    The answer is read as the JSON object the prompt asks for; a regex scan is the fallback
+
+    Returns:
+        dict: {'about': float, 'not_about': float, 'unknown': float} for the keys found
+    """
+    answer = re.sub(r'<think>.*?</think>', '', text, flags=re.DOTALL)
+    start = answer.find('{')
+    end = answer.rfind('}')
+    if start != -1 and end > start:
+        try:
+            entry = json.loads(answer[start:end+1])
+        except json.JSONDecodeError:
+            entry = None
+        if isinstance(entry, dict):
+            scores = _entry_scores(entry)
+            if scores:
+                return scores
+    scores = {}
+    for name, value in _SCORE_RE.findall(answer):
+        key = _score_name(name)
+        if key:
+            scores.setdefault(key, float(value))
+    return scores
+
+def parse_batch_scores(text, count):
+    """
+    Scores for each call of a batched answer (a JSON array with one object per call)
+
+    Returns:
+        list: count entries, each a scores dict or None where the answer had no usable entry
+    """
+    answer = re.sub(r'<think>.*?</think>', '', text, flags=re.DOTALL)
+    start = answer.find('[')
+    end = answer.rfind(']')
+    results = [None] * count
+    if start == -1 or end <= start:
+        return results
+    try:
+        entries = json.loads(answer[start:end+1])
+    except json.JSONDecodeError:
+        return results
+    for index, entry in enumerate(entries if isinstance(entries, list) else []):
+        if not isinstance(entry, dict):
+            continue
+        call = entry.get('call', index + 1)
+        if not isinstance(call, int) or not 1 <= call <= count:
+            continue
+        scores = _entry_scores(entry)
+        if scores and results[call - 1] is None:
+            results[call - 1] = scores
+    return results
+
+def parse_multi_scores(text, count):
+    """
+    Scores for each question of a multi-question answer (a JSON object keyed "1" to "count")
+
+    Returns:
+        list: count entries, each a scores dict or None where the answer had no usable entry
+    """
+    answer = re.sub(r'<think>.*?</think>', '', text, flags=re.DOTALL)
+    start = answer.find('{')
+    end = answer.rfind('}')
+    results = [None] * count
+    if start == -1 or end <= start:
+        return results
+    try:
+        entries = json.loads(answer[start:end+1])
+    except json.JSONDecodeError:
+        return results
+    if not isinstance(entries, dict):
+        return results
+    for number in range(1, count + 1):
+        entry = entries.get(str(number))
+        if isinstance(entry, dict):
+            results[number - 1] = _entry_scores(entry) or None
+    return results
+
+class ScoringEngine:
+    """
+    Score many texts concurrently against Ollama /api/generate.
+
+    concurrency bounds the number of requests in flight; the client is shared
+    by every worker so connections are reused. A client passed in is left
+    open by close().
+    """
+
+    def __init__(self, model=DEFAULT_MODEL, url=OLLAMA_GENERATE_URL, concurrency=4, timeout=300, session=None, client=None):
+        self.model = model
+        self.concurrency = concurrency
+        self._owns_client = client is None
+        self.client = client or OllamaClient(url, read_timeout=timeout, pool_size=concurrency, session=session)
+
+    def score_text(self, question, text):
+        """Score a single text; returns the parsed scores dict or None on failure"""
+        try:
+            response = self.client.generate(self.model, build_row_prompt(question, text), _OPTIONS)
+            return Scores(parse_scores(response.get("response", "")), ROW_PROMPT_VERSION)
+        except Exception as e:
+            debug_error(f"Failed to score row: {str(e)}")
+            debug_error(f"Traceback: {traceback.format_exc()}")
+            return None
+
+    def score_batch(self, question, texts):
+        """
+        Score several texts in one request
+
+        Texts the batched answer does not cover are scored one at a time.
+
+        Returns:
+            list: One Scores (or None) per text, in order, tagged with the prompt that produced it
+        """
+        texts = list(texts)
+        if len(texts) == 1:
+            return [self.score_text(question, texts[0])]
+        try:
+            response = self.client.generate(self.model, build_batch_prompt(question, texts), _OPTIONS)
+            results = [None if scores is None else Scores(scores, BATCH_PROMPT_VERSION)
+                       for scores in parse_batch_scores(response.get("response", ""), len(texts))]
+        except Exception as e:
+            debug_error(f"Failed to score batch of {len(texts)}: {str(e)}")
+            results = [None] * len(texts)
+        missing = [index for index, result in enumerate(results) if result is None]
+        if missing:
+            debug_print(f"Batch answer missed {len(missing)}/{len(texts)} call(s), scoring them singly")
+            for index in missing:
+                results[index] = self.score_text(question, texts[index])
+        return results
+
+    def score_multi(self, questions, text):
+        """
+        Score one text against several questions in one request
+
+        Questions the combined answer does not cover are scored one at a time.
+
+        Returns:
+            list: One Scores (or None) per question, in order, tagged with the prompt that produced it
+        """
+        if len(questions) == 1:
+            return [self.score_text(questions[0], text)]
+        try:
+            response = self.client.generate(self.model, build_multi_prompt(questions, text), _OPTIONS)
+            results = [None if scores is None else Scores(scores, MULTI_PROMPT_VERSION)
+                       for scores in parse_multi_scores(response.get("response", ""), len(questions))]
+        except Exception as e:
+            debug_error(f"Failed to score row against {len(questions)} questions: {str(e)}")
+            results = [None] * len(questions)
+        for index, result in enumerate(results):
+            if result is None:
+                results[index] = self.score_text(questions[index], text)
+        return results
+
+    def iter_batch_scores(self, question, batches):
+        """
+        Score batches of (key, text) pairs lazily, yielding (key, scores or None)
+        Batches are yielded in input order, each batch's items in their batch order
+        """
+        window = collections.deque()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            for batch in batches:
+                batch = list(batch)
+                window.append((batch, pool.submit(self.score_batch, question, [text for _, text in batch])))
+                if len(window) >= self.concurrency * 2:
+                    batch, future = window.popleft()
+                    yield from zip((key for key, _ in batch), future.result())
+            while window:
+                batch, future = window.popleft()
+                yield from zip((key for key, _ in batch), future.result())
+
+    def score_rows(self, question, texts):
+        """
+        Score every text with the same rating prompt
+
+        Returns:
+            list: One scores dict (or None) per text, in the same order as texts
+        """
+        return [scores for _, scores in self.iter_scores(question, ((text, text) for text in texts))]
+
+    def iter_scores(self, question, items):
+        """
+        Score (key, text) pairs lazily, yielding (key, scores or None) in input order
+
+        At most 2 * concurrency texts are read ahead of the results being
+        consumed, so a large (streamed) input never sits in memory at once
+        """
+        return self._iter_window(lambda text: self.score_text(question, text), items)
+
+    def iter_multi_scores(self, questions, items):
+        """
+        Score (key, text) pairs against every question lazily, yielding
+        (key, list of scores or None per question) in input order
+        """
+        return self._iter_window(lambda text: self.score_multi(questions, text), items)
+
+    def _iter_window(self, score, items):
+        window = collections.deque()
+        total = 0
+        scored = 0
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            for key, text in items:
+                window.append((key, pool.submit(score, text)))
+                total += 1
+                if len(window) >= self.concurrency * 2:
+                    key, future = window.popleft()
+                    result = future.result()
+                    scored += 1 if result and any(result) else 0
+                    yield key, result
+            while window:
+                key, future = window.popleft()
+                result = future.result()
+                scored += 1 if result and any(result) else 0
+                yield key, result
+        debug_print(f"Scored {scored}/{total} row(s) with up to {self.concurrency} concurrent request(s)")
+
+    def close(self):
+        if self._owns_client:
+            self.client.close()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+sheet_writer.py - Batched Google Sheets cell writer
+Queues cell writes and sends them to the Apps Script web app (go.js doPost)
+as one multi-cell payload per sheet over a pooled keep-alive session.
+Every POST goes through the shared outbound scheduler (outbound.py), which
+rate limits Apps Script calls and retries quota errors instead of losing them
+"""
+
+import json
+import os
+import threading
+import traceback
+
+import requests
+
+from debug_utils import debug_print, debug_error
+from outbound import OUTBOUND, BULK, Throttled
+
+# Apps Script's answer (HTTP 200) when a per-user quota is exhausted
+_QUOTA_MARKERS = ('Service invoked too many times', 'too many simultaneous invocations', 'Rate Limit Exceeded')
+
+WEB_APP_URL = os.environ.get(
+    'SHEETS_WEB_APP_URL',
+    "https://script.google.com/macros/s/AKfycbyPWPxmGCoxjYp3fULvxk-ruXNRga6KDRNNQbTl_jvTCOacvy15nPPE-qWzN4iz3g4Q4g/exec"
+)
+
+class SheetWriter:
+    """
+    Queue (sheet_id, sheet_name, row, column, value) writes and flush them in batches.
+
+    A flush happens when max_cells writes are pending, when max_delay seconds
+    have passed since the first pending write, or when flush()/close() is called.
+    Writes to the same cell before a flush are merged (last value wins).
+
+    Flushes are BULK priority unless flush(priority=INTERACTIVE) is used;
+    each writer is its own job for fair queuing in the outbound scheduler.
+    """
+
+    def __init__(self, web_app_url=WEB_APP_URL, max_cells=50, max_delay=2.0, timeout=10, session=None,
+                 scheduler=OUTBOUND):
+        self.web_app_url = web_app_url
+        self.scheduler = scheduler
+        self.max_cells = max_cells
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.session = session or requests.Session()
+        self.session.headers.update({"Content-Type": "application/json"})
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._timer = None
+        self.round_trips = 0
+
+    def write(self, sheet_id, sheet_name, row, column, value):
+        """Queue a single cell write, flushing if the size threshold is reached"""
+        with self._lock:
+            self._pending[(sheet_id, sheet_name, row, column)] = value
+            full = len(self._pending) >= self.max_cells
+            if not full and self._timer is None and self.max_delay is not None:
+                self._timer = threading.Timer(self.max_delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if full:
+            self.flush()
+
+    def flush(self, priority=BULK):
+        """
+        Send every pending write, one POST per (sheet_id, sheet_name).
+
+        Returns:
+            list: Response text for each POST sent ("fail" if it could not be sent)
+        """
+        with self._lock:
+            pending = self._pending
+            self._pending = {}
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+        sheets = {}
+        for (sheet_id, sheet_name, row, column), value in pending.items():
+            sheets.setdefault((sheet_id, sheet_name), []).append({
+                "row": row,
+                "column": column,
+                "value": value
+            })
+
+        responses = []
+        for (sheet_id, sheet_name), cells in sheets.items():
+            body = {
+                "sheet_id": sheet_id,
+                "sheet_name": sheet_name,
+                "cells": cells
+            }
+            responses.append(self._post(body, priority))
+        return responses
+
+    def write_ranges(self, sheet_id, sheet_name, ranges, priority=BULK):
+        """
+        Write blocks of rows given as (row, column, values) - values a list of
+        equal-length lists starting at (row, column) - in one POST, bypassing the cell queue
+
+        Returns:
+            str: Response text ("fail" if it could not be sent), or None if there was nothing to write
+        """
+        ranges = [{"row": row, "column": column, "values": values} for row, column, values in ranges]
+        if not ranges:
+            return None
+        body = {
+            "sheet_id": sheet_id,
+            "sheet_name": sheet_name,
+            "ranges": ranges
+        }
+        return self._post(body, priority)
+
+    def _send(self, body):
+        if 'ranges' in body:
+            debug_print(f"Sending {len(body['ranges'])} range(s), "
+                        f"{sum(len(block['values']) for block in body['ranges'])} row(s), to Google Apps Script...")
+        else:
+            debug_print(f"Sending {len(body['cells'])} cell(s) to Google Apps Script...")
+        response = self.session.post(self.web_app_url, data=json.dumps(body), timeout=self.timeout)
+        self.round_trips += 1
+        debug_print(f"Google Apps Script response status: {response.status_code}")
+        debug_print(f"Response text: {response.text}")
+        quota = any(marker in response.text for marker in _QUOTA_MARKERS)
+        if quota or response.status_code in (429, 503):
+            retry_after = response.headers.get('Retry-After', '')
+            raise Throttled("Apps Script quota exceeded" if quota else f"Apps Script HTTP {response.status_code}",
+                            retry_after=float(retry_after) if retry_after.isdigit() else None)
+        return response.text
+
+    def _post(self, body, priority=BULK):
+        try:
+            return self.scheduler.call('sheets', lambda: self._send(body), priority=priority, job=id(self))
+        except Exception as e:
+            debug_error(f"Failed to reach Google Apps Script: {str(e)}")
+            debug_error(f"Traceback: {traceback.format_exc()}")
+            return "fail"
+
+    def close(self):
+        """Flush anything still pending and release pooled connections"""
+        responses = self.flush()
+        self.session.close()
+        return responses
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
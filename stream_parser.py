@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+stream_parser.py - Incremental parser for streamed deepseek-r1 output
+Splits tokens into <think> reasoning and answer text as they arrive and
+detects when the answer has emitted one complete, balanced JSON object,
+so the caller can stop reading the stream early
+"""
+
+OPEN_TAG = '<think>'
+CLOSE_TAG = '</think>'
+
+def _partial_tag_length(text, tag):
+    """Length of the longest suffix of text that is a prefix of tag (a tag split across tokens)"""
+    for size in range(min(len(tag) - 1, len(text)), 0, -1):
+        if text.endswith(tag[:size]):
+            return size
+    return 0
+
+class ThinkStreamParser:
+    """
+    Feed tokens with feed(); read thinking_blocks, answer_text and json_text.
+
+    All text is accumulated in lists and joined once, so long reasoning
+    traces cost linear time. Braces inside JSON strings are ignored when
+    tracking depth.
+    """
+
+    def __init__(self):
+        self.in_think = False
+        self.thinking_blocks = []
+        self.json_text = None
+        self._raw = []
+        self._think = []
+        self._answer = []
+        self._json = []
+        self._carry = ''
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    @property
+    def complete(self):
+        """True once a balanced top-level JSON object has been seen in the answer"""
+        return self.json_text is not None
+
+    @property
+    def full_response(self):
+        return ''.join(self._raw)
+
+    @property
+    def answer_text(self):
+        return ''.join(self._answer).strip()
+
+    def feed(self, token):
+        """Consume one streamed token; returns True once the JSON answer is complete"""
+        self._raw.append(token)
+        text = self._carry + token
+        self._carry = ''
+        while text:
+            tag = CLOSE_TAG if self.in_think else OPEN_TAG
+            index = text.find(tag)
+            if index == -1:
+                keep = _partial_tag_length(text, tag)
+                self._consume(text[:len(text) - keep])
+                self._carry = text[len(text) - keep:]
+                break
+            self._consume(text[:index])
+            if self.in_think:
+                self.thinking_blocks.append(''.join(self._think))
+                self._think = []
+            self.in_think = not self.in_think
+            text = text[index + len(tag):]
+        return self.complete
+
+    def finish(self):
+        """Flush any held-back partial tag at the end of the stream"""
+        self._consume(self._carry)
+        self._carry = ''
+        if self.in_think and self._think:
+            self.thinking_blocks.append(''.join(self._think))
+            self._think = []
+
+    def _consume(self, text):
+        if not text:
+            return
+        if self.in_think:
+            self._think.append(text)
+            return
+        self._answer.append(text)
+        if self.complete:
+            return
+        for char in text:
+            if self._depth == 0:
+                if char != '{':
+                    continue
+                self._json = []
+            self._json.append(char)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == '{':
+                self._depth += 1
+            elif char == '}':
+                self._depth -= 1
+                if self._depth == 0:
+                    self.json_text = ''.join(self._json)
+                    return
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+task_writer.py - Streaming writer/reader for scheduler .task files
+Each CSV row is [json payload, function name, table]. The payload fields
+shared by every row (server, question, sheet_id, sheet_name, topic) are
+encoded once; only Text/row/column are encoded per row.
+
+Format v2 moves the multi-kilobyte rating prompt out of the rows: a
+PromptTable row carrying {"task_format": 2, "prompt_id", "prompt"} is
+written before the first row that uses it, and rows carry "prompt_id"
+instead of "question". read_task_rows() expands either format back to
+v1 payloads.
+"""
+
+import csv
+import gzip
+import hashlib
+import json
+
+TASK_FUNCTION = "CallBackTest"
+TASK_TABLE = "testing"
+PROMPT_TABLE_FUNCTION = "PromptTable"
+
+def prompt_id(prompt):
+    """Content hash used to reference a prompt from v2 rows"""
+    return hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:16]
+
+def open_task_file(path, mode):
+    """Open a task file for text CSV I/O, transparently gzipped for '.gz' paths"""
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', newline='', encoding='utf-8')
+    return open(path, mode, newline='', encoding='utf-8')
+
+def read_task_rows(path):
+    """
+    Yield (payload dict, function, table) for every task row in a v1 or v2 file
+    PromptTable rows are consumed and their prompts restored as "question"
+    """
+    prompts = {}
+    with open_task_file(path, 'r') as f:
+        for payload, function, table in csv.reader(f):
+            data = json.loads(payload)
+            if function == PROMPT_TABLE_FUNCTION:
+                prompts[data['prompt_id']] = data['prompt']
+                continue
+            if 'prompt_id' in data:
+                data['question'] = prompts[data.pop('prompt_id')]
+            yield data, function, table
+
+class TaskFileWriter:
+    """
+    Write task rows one at a time so a sheet of any size builds in constant memory.
+
+    With compress=True the file is gzip-compressed as it is written and
+    '.gz' is appended to the path. With format_version=2 the envelope's
+    "question" is written once to a PromptTable row and referenced by id.
+    """
+
+    def __init__(self, path, envelope, compress=False, function=TASK_FUNCTION, table=TASK_TABLE, format_version=1):
+        self.path = path + '.gz' if compress else path
+        self.function = function
+        self.table = table
+        self.rows_written = 0
+        self._file = open_task_file(self.path, 'w')
+        self._writer = csv.writer(self._file)
+
+        if format_version == 2 and 'question' in envelope:
+            envelope = dict(envelope)
+            prompt = envelope.pop('question')
+            envelope['prompt_id'] = prompt_id(prompt)
+            self._writer.writerow([
+                json.dumps({'task_format': 2, 'prompt_id': envelope['prompt_id'], 'prompt': prompt}),
+                PROMPT_TABLE_FUNCTION,
+                self.table
+            ])
+        # '{"server": "...", ..., "topic": "..."' - each row appends its own fields and the closing brace
+        self._prefix = json.dumps(envelope)[:-1]
+
+    def write_row(self, text, row, column):
+        payload = f'{self._prefix}, "Text": {json.dumps(str(text))}, "row": {int(row)}, "column": {int(column)}}}'
+        self._writer.writerow([payload, self.function, self.table])
+        self.rows_written += 1
+
+    def write_rows(self, rows):
+        """Write every (text, row, column) tuple from an iterable"""
+        for text, row, column in rows:
+            self.write_row(text, row, column)
+        return self.rows_written
+
+    def close(self):
+        self._file.close()
+        return self.path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
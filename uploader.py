@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+uploader.py - Resumable .task uploads to the scheduler
+Large task files are split into bounded-size parts on CSV row boundaries.
+Each part is streamed from disk as a multipart POST over a pooled session,
+retried with exponential backoff and jitter, and recorded in a sidecar
+<task>.manifest.json so an interrupted upload resumes where it stopped.
+"""
+
+import csv
+import json
+import os
+import random
+import time
+import uuid
+
+import requests
+
+from debug_utils import debug_print, debug_error
+from task_writer import PROMPT_TABLE_FUNCTION, open_task_file
+
+SCHEDULER_UPLOAD_URL = os.environ.get('SCHEDULER_UPLOAD_URL', "https://scheduler.slqmyadmin.com/upload")
+
+class _MultipartFileStream:
+    """File-like multipart/form-data body that reads the file lazily instead of buffering it"""
+
+    def __init__(self, path, field='file'):
+        self.boundary = uuid.uuid4().hex
+        filename = os.path.basename(path)
+        self._head = (
+            f'--{self.boundary}\r\n'
+            f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            f'Content-Type: application/octet-stream\r\n\r\n'
+        ).encode('utf-8')
+        self._tail = f'\r\n--{self.boundary}--\r\n'.encode('utf-8')
+        self._file = open(path, 'rb')
+        self.len = len(self._head) + os.path.getsize(path) + len(self._tail)
+        self._stage = 0
+
+    @property
+    def content_type(self):
+        return f'multipart/form-data; boundary={self.boundary}'
+
+    def __len__(self):
+        return self.len
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.len
+        out = b''
+        while len(out) < size and self._stage < 3:
+            if self._stage == 0:
+                out += self._head
+                self._stage = 1
+            elif self._stage == 1:
+                chunk = self._file.read(size - len(out))
+                if chunk:
+                    out += chunk
+                else:
+                    self._stage = 2
+            else:
+                out += self._tail
+                self._stage = 3
+        return out
+
+    def close(self):
+        self._file.close()
+
+def split_task_file(task_filename, max_part_bytes):
+    """
+    Split a task file into parts of roughly max_part_bytes, never inside a row
+    Format v2 PromptTable rows are repeated at the top of every part so each part stands alone
+
+    Returns:
+        list: Part file paths (just [task_filename] if it already fits)
+    """
+    if os.path.getsize(task_filename) <= max_part_bytes:
+        return [task_filename]
+
+    base, ext = (task_filename[:-3], '.gz') if task_filename.endswith('.gz') else (task_filename, '')
+    parts = []
+    prompt_rows = []
+    part_file = None
+    part_bytes = 0
+    with open_task_file(task_filename, 'r') as source:
+        for row in csv.reader(source):
+            # Row size before compression: conservative for .gz parts
+            row_bytes = sum(len(field.encode('utf-8')) for field in row) + 8
+            if part_file is None or (part_bytes and part_bytes + row_bytes > max_part_bytes):
+                if part_file is not None:
+                    part_file.close()
+                path = f"{base}.part{len(parts):03d}{ext}"
+                parts.append(path)
+                part_file = open_task_file(path, 'w')
+                writer = csv.writer(part_file)
+                writer.writerows(prompt_rows)
+                part_bytes = 0
+            writer.writerow(row)
+            part_bytes += row_bytes
+            if len(row) > 1 and row[1] == PROMPT_TABLE_FUNCTION:
+                prompt_rows.append(row)
+    if part_file is not None:
+        part_file.close()
+    return parts
+
+class TaskUploader:
+    """
+    Upload task files to the scheduler with retries and resume.
+
+    Responses with HTTP 429 or 5xx and connection errors are retried up to
+    max_retries times; any other non-2xx status fails the part immediately.
+    With retry_throttled=False a 429 also returns at once, for callers that
+    back off themselves (the outbound scheduler).
+    """
+
+    def __init__(self, url=SCHEDULER_UPLOAD_URL, max_part_bytes=5 * 1024 * 1024, max_retries=5,
+                 backoff=1.0, max_backoff=30.0, timeout=(10, 300), session=None, retry_throttled=True):
+        self.url = url
+        self.max_part_bytes = max_part_bytes
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.session = session or requests.Session()
+        self.retry_throttled = retry_throttled
+        self.bytes_uploaded = 0
+
+    def upload(self, task_filename):
+        """
+        Upload a task file, resuming from its manifest if a previous attempt was interrupted
+
+        Returns:
+            dict: success (every part accepted), http_code and response of the last part,
+                  task_file, random_id, bytes/seconds spent by this call and per-part results
+
+        Raises:
+            FileNotFoundError: If the file doesn't exist
+        """
+        if not os.path.exists(task_filename):
+            raise FileNotFoundError(f"File does not exist: {task_filename}")
+
+        manifest_path = task_filename + '.manifest.json'
+        manifest = self._load_manifest(manifest_path)
+        if manifest is None:
+            manifest = {
+                'task_file': task_filename,
+                'random_id': str(uuid.uuid4()),
+                'parts': [{'path': path, 'uploaded': False} for path in split_task_file(task_filename, self.max_part_bytes)]
+            }
+            self._save_manifest(manifest_path, manifest)
+        else:
+            debug_print(f"Resuming upload of {task_filename} from manifest")
+
+        started = time.perf_counter()
+        sent = 0
+        http_code = None
+        json_response = None
+        for part in manifest['parts']:
+            if part['uploaded']:
+                continue
+            http_code, json_response, part_bytes = self._upload_part(part['path'])
+            sent += part_bytes
+            part['http_code'] = http_code
+            part['uploaded'] = http_code is not None and 200 <= http_code < 300
+            self._save_manifest(manifest_path, manifest)
+            if not part['uploaded']:
+                break
+
+        success = all(part['uploaded'] for part in manifest['parts'])
+        if success:
+            self._cleanup(manifest_path, manifest)
+
+        return {
+            'success': success,
+            'http_code': http_code,
+            'response': json_response,
+            'task_file': task_filename,
+            'random_id': manifest['random_id'],
+            'bytes': sent,
+            'seconds': time.perf_counter() - started,
+            'parts': [{'path': part['path'], 'uploaded': part['uploaded']} for part in manifest['parts']]
+        }
+
+    def _upload_part(self, path):
+        """POST one part, retrying transient failures; returns (http_code, json response, bytes accepted)"""
+        http_code = None
+        json_response = None
+        for attempt in range(self.max_retries + 1):
+            body = _MultipartFileStream(path)
+            try:
+                response = self.session.post(self.url, data=body, timeout=self.timeout,
+                                             headers={'Content-Type': body.content_type})
+                http_code = response.status_code
+                try:
+                    json_response = response.json()
+                except ValueError:
+                    json_response = None
+                if 200 <= http_code < 300:
+                    self.bytes_uploaded += body.len
+                    debug_print(f"Uploaded {path} ({body.len} bytes) - HTTP {http_code}")
+                    return http_code, json_response, body.len
+                if http_code != 429 and http_code < 500:
+                    debug_error(f"Upload of {path} rejected - HTTP {http_code}")
+                    return http_code, json_response, 0
+                if http_code == 429 and not self.retry_throttled:
+                    debug_error(f"Upload of {path} throttled - HTTP 429")
+                    return http_code, json_response, 0
+                debug_error(f"Upload of {path} failed - HTTP {http_code} (attempt {attempt + 1})")
+            except requests.exceptions.RequestException as e:
+                debug_error(f"Upload of {path} failed: {str(e)} (attempt {attempt + 1})")
+            finally:
+                body.close()
+
+            if attempt < self.max_retries:
+                # Exponential backoff with full jitter
+                time.sleep(random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt)))
+        return http_code, json_response, 0
+
+    def _load_manifest(self, manifest_path):
+        try:
+            with open(manifest_path, 'r') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if all(os.path.exists(part['path']) for part in manifest['parts'] if not part['uploaded']):
+            return manifest
+        return None
+
+    def _save_manifest(self, manifest_path, manifest):
+        tmp_path = manifest_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, manifest_path)
+
+    def _cleanup(self, manifest_path, manifest):
+        for part in manifest['parts']:
+            if part['path'] != manifest['task_file'] and os.path.exists(part['path']):
+                os.remove(part['path'])
+        os.remove(manifest_path)
+
+    def close(self):
+        self.session.close()